@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.redis import RedisCache as BaseRedisCache
+
+
+class LRUCache:
+    """
+    A thread-safe in-process cache that evicts the least recently used entry once
+    max_entries is reached and expires entries after timeout seconds.
+    """
+
+    def __init__(self, max_entries: int, timeout: float):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout: float | None = None) -> None:
+        expires_at = time.monotonic() + (self.timeout if timeout is None else timeout)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SharedVersion:
+    """
+    A version number kept in a shared cache. Bumping it invalidates every value that
+    was cached under the previous version, in all worker processes. Each process
+    trusts its last read for local_timeout seconds, which bounds how long other
+    processes may keep serving values of an old version.
+    """
+
+    def __init__(self, name: str, cache_alias: str = "default", local_timeout=2.0):
+        self.key = f"version:{name}"
+        self.cache_alias = cache_alias
+        self.local_timeout = local_timeout
+        self._local = LRUCache(max_entries=1, timeout=local_timeout)
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def get(self) -> int:
+        version = self._local.get(self.key)
+        if version is None:
+            version = self.cache.get(self.key)
+            if version is None:
+                # Start from the current time so that a version evicted from the
+                # shared cache never restarts at a number that was used before.
+                self.cache.add(self.key, time.time_ns(), timeout=None)
+                version = self.cache.get(self.key, time.time_ns())
+            self._local.set(self.key, version)
+        return version
+
+    async def aget(self) -> int:
+        version = self._local.get(self.key)
+        if version is None:
+            version = await self.cache.aget(self.key)
+            if version is None:
+                await self.cache.aadd(self.key, time.time_ns(), timeout=None)
+                version = await self.cache.aget(self.key, time.time_ns())
+            self._local.set(self.key, version)
+        return version
+
+    def bump(self) -> int:
+        try:
+            version = self.cache.incr(self.key)
+        except ValueError:
+            version = time.time_ns()
+            self.cache.set(self.key, version, timeout=None)
+        self._local.set(self.key, version)
+        return version
+
+
+class RedisCache(BaseRedisCache):
+    """
+    Django's Redis cache with async methods that do not run in the thread shared
+    with the ORM. The Redis client's connection pool is thread-safe, so the calls
+    of concurrent requests need not wait for each other.
+    """
+
+    async def aget(self, key, default=None, version=None):
+        return await sync_to_async(self.get, thread_sensitive=False)(
+            key, default, version
+        )
+
+    async def aget_many(self, keys, version=None):
+        return await sync_to_async(self.get_many, thread_sensitive=False)(keys, version)
+
+    async def aset(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return await sync_to_async(self.set, thread_sensitive=False)(
+            key, value, timeout, version
+        )
+
+    async def aset_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        return await sync_to_async(self.set_many, thread_sensitive=False)(
+            data, timeout, version
+        )
+
+    async def aadd(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return await sync_to_async(self.add, thread_sensitive=False)(
+            key, value, timeout, version
+        )
+
+    async def adelete(self, key, version=None):
+        return await sync_to_async(self.delete, thread_sensitive=False)(key, version)
@@ -1,12 +1,41 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.conf import settings
 from django.http import HttpResponse
+from wagtail.contrib.redirects.middleware import (
+    RedirectMiddleware as WagtailRedirectMiddleware,
+)
 
 
 class HealthCheckMiddleware:
+    async_capable = True
+    sync_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
         if request.path == f"{settings.BASE_PATH}health":
             return HttpResponse("ok")
         return self.get_response(request)
+
+    async def __acall__(self, request):
+        if request.path == f"{settings.BASE_PATH}health":
+            return HttpResponse("ok")
+        return await self.get_response(request)
+
+
+class RedirectMiddleware(WagtailRedirectMiddleware):
+    """
+    Wagtail's redirect middleware looks up a redirect for every 404 response. The
+    404 responses of the image-auth API answer auth subrequests for media files and
+    must not be redirected, so the lookup is skipped for them.
+    """
+
+    def process_response(self, request, response):
+        if request.path_info.startswith("/api/image-auth/"):
+            return response
+        return super().process_response(request, response)
@@ -27,6 +27,7 @@ INSTALLED_APPS = [
     "custom_images",
     "experience",
     "image_auth",
+    "jobs",
     "wagtail_localize",
     "wagtail_localize.locales",
     "wagtail.contrib.forms",
@@ -60,7 +61,7 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "wagtail.contrib.redirects.middleware.RedirectMiddleware",
+    "cheminova.middleware.RedirectMiddleware",
 ]
 
 ROOT_URLCONF = "cheminova.urls"
@@ -97,6 +98,32 @@ DATABASES = {
 }
 
 
+# Cache
+# Shared by all processes (web and ASGI servers and the job worker), which invalidate
+# each other's cached values through it, see cheminova.cache.SharedVersion. A
+# process-local cache would leave the other processes with stale image-auth
+# decisions. Redis at REDIS_URL, e.g. redis://redis:6379/0, is the shared cache.
+# Without it the cache falls back to a database table (manage.py createcachetable),
+# which turns every cache read and write into queries, e.g. for tests.
+
+REDIS_URL = os.getenv("REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "cheminova.cache.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "cheminova_cache",
+            "OPTIONS": {"MAX_ENTRIES": 100_000},
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -225,3 +252,83 @@ WAGTAIL_CONTENT_LANGUAGES = LANGUAGES = [
 WAGTAILIMAGES_IMAGE_MODEL = "custom_images.CustomImage"
 
 API_BASE_URL = "/api"
+
+# Image auth
+# Decisions of the image-auth endpoint are cached per media path and user, both
+# in-process and in the shared cache. They are invalidated by bumping a version,
+# which other worker processes pick up within IMAGE_AUTH_CACHE_VERSION_TIMEOUT.
+IMAGE_AUTH_CACHE_ALIAS = "default"
+IMAGE_AUTH_CACHE_TIMEOUT = 300
+IMAGE_AUTH_CACHE_MAX_ENTRIES = 10_000
+IMAGE_AUTH_CACHE_VERSION_TIMEOUT = 2
+# Public decisions may be cached by nginx for this many seconds. Media URLs do not
+# change when an image becomes private, so this is how long it stays visible.
+IMAGE_AUTH_PUBLIC_MAX_AGE = 10
+# Maximum number of media URIs checked by one request to the batch endpoint.
+IMAGE_AUTH_BATCH_MAX_URIS = 500
+# Media paths without an image are remembered for a short time, so repeated requests
+# for them (crawlers, broken clients) do not query the database.
+IMAGE_AUTH_NOT_FOUND_TIMEOUT = 60
+IMAGE_AUTH_NOT_FOUND_MAX_ENTRIES = 10_000
+
+# Media URLs in API responses are signed with an expiry when a secret is set, see
+# image_auth.signing. The same secret has to be configured for nginx.
+MEDIA_URL_SIGNING_SECRET = None
+MEDIA_URL_SIGNING_EXPIRES = 3600
+
+# Custom images
+# The collections an editor has image permissions for are cached per user until
+# group memberships, collection permissions or collections change.
+CUSTOM_IMAGES_CACHE_ALIAS = "default"
+CUSTOM_IMAGES_PERMISSIONS_CACHE_TIMEOUT = 3600
+CUSTOM_IMAGES_CACHE_VERSION_TIMEOUT = 2
+# Rendered image lists are cached by their ETag, which changes with every
+# modification of the listed collections, see custom_images.views.
+CUSTOM_IMAGES_LIST_CACHE_TIMEOUT = 300
+# Delta requests with an older since parameter must refetch the whole list.
+CUSTOM_IMAGES_REMOVED_IMAGES_RETENTION = 7 * 24 * 3600
+# The next cursor of a delta lies this many seconds before the request, so changes
+# that commit after the request with an earlier updated_at are sent next time.
+CUSTOM_IMAGES_DELTA_OVERLAP = 10
+# Image event streams, see custom_images.events. Clients that reconnect after
+# CUSTOM_IMAGES_EVENTS_RETENTION get a reset event.
+CUSTOM_IMAGES_EVENTS_POLL_INTERVAL = 1
+CUSTOM_IMAGES_EVENTS_HEARTBEAT = 15
+CUSTOM_IMAGES_EVENTS_RETRY = 5
+CUSTOM_IMAGES_EVENTS_RETENTION = 24 * 3600
+# Events are read again for this many seconds, in case they commit out of id order.
+CUSTOM_IMAGES_EVENTS_SETTLE = 10
+# Filter specs of the renditions generated when images are uploaded or approved, for
+# all images ("*") or the images of a character (by slug), see
+# custom_images.renditions.
+# Every filter spec is encoded once per format, keep both lists short. After
+# changing them, generate_renditions queues the missing renditions.
+CUSTOM_IMAGES_RENDITIONS = {
+    "*": ["fill-400x400"],
+}
+# The renditions are also generated in these formats and served in the first one a
+# request asks for, see custom_images.renditions.get_rendition_format. AVIF is
+# smaller but takes several times longer to encode than WebP.
+CUSTOM_IMAGES_RENDITION_FORMATS = ["webp"]
+# Widths of the renditions in the srcset of the image APIs, generated for all images.
+CUSTOM_IMAGES_SRCSET_WIDTHS = [400, 800, 1600]
+# Uploads through the image API are checked before they are decoded and downscaled
+# to CUSTOM_IMAGES_UPLOAD_MAX_EDGE (None keeps their size), see
+# custom_images.serializers.ImageFieldWithUniqueName. Formats are Pillow's names.
+CUSTOM_IMAGES_UPLOAD_FORMATS = ["JPEG", "PNG", "GIF", "WEBP"]
+CUSTOM_IMAGES_UPLOAD_MAX_PIXELS = 50_000_000
+CUSTOM_IMAGES_UPLOAD_MAX_EDGE = 2560
+CUSTOM_IMAGES_UPLOAD_KEEP_ORIGINAL = False
+# Repeated uploads of the same file with the same text to a character within this many
+# seconds return the existing image instead of storing a copy (None disables it).
+CUSTOM_IMAGES_UPLOAD_DEDUP_WINDOW = 600
+
+# Background jobs run by the run_worker command, see jobs.worker. Timeouts and
+# intervals are in seconds.
+JOBS_CONCURRENCY = 4
+JOBS_MAX_ATTEMPTS = 3
+JOBS_TIMEOUT = 300
+JOBS_RETRY_DELAY = 10
+JOBS_POLL_INTERVAL = 1
+JOBS_RETENTION = 7 * 24 * 3600
+JOBS_PRUNE_INTERVAL = 3600
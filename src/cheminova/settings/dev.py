@@ -10,6 +10,7 @@ SERVE_STATIC = False
 
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.getenv("SECRET_KEY")
+MEDIA_URL_SIGNING_SECRET = os.getenv("MEDIA_URL_SIGNING_SECRET")
 
 WAGTAILADMIN_BASE_URL = os.getenv("WAGTAILADMIN_BASE_URL", "http://localhost:8080/cms/")
 SITE_URL = os.getenv("SITE_URL", WAGTAILADMIN_BASE_URL)
@@ -12,6 +12,7 @@ SITE_URL = os.getenv("SITE_URL", WAGTAILADMIN_BASE_URL)
 parsed_base_url = urlparse(WAGTAILADMIN_BASE_URL)
 ALLOWED_HOSTS = ["localhost", "127.0.0.1", parsed_base_url.hostname]
 SECRET_KEY = os.getenv("SECRET_KEY")
+MEDIA_URL_SIGNING_SECRET = os.getenv("MEDIA_URL_SIGNING_SECRET")
 CSRF_TRUSTED_ORIGINS = [
     "http://127.0.0.1",
     "http://127.0.0.1:8080",
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class CustomImagesConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "custom_images"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,88 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from cheminova.cache import LRUCache
+
+# Other processes pick up modifications when their local entry expires.
+local_modified = LRUCache(
+    max_entries=1000, timeout=settings.CUSTOM_IMAGES_CACHE_VERSION_TIMEOUT
+)
+
+
+def get_modified_key(collection_id: int) -> str:
+    return f"image-collection-modified:{collection_id}"
+
+
+def get_collections_modified(collection_ids) -> dict[int, float]:
+    """
+    Get the time the images of each collection were last modified, from the shared
+    cache in a single round trip. Collections without a known modification time,
+    e.g. after the cache was cleared, count as modified now.
+    """
+    modified = {}
+    missing_ids = []
+    for collection_id in collection_ids:
+        timestamp = local_modified.get(collection_id)
+        if timestamp is None:
+            missing_ids.append(collection_id)
+        else:
+            modified[collection_id] = timestamp
+
+    if missing_ids:
+        cache = caches[settings.CUSTOM_IMAGES_CACHE_ALIAS]
+        keys = {
+            get_modified_key(collection_id): collection_id
+            for collection_id in missing_ids
+        }
+        cached = cache.get_many(keys.keys())
+        now = time.time()
+        for key, collection_id in keys.items():
+            timestamp = cached.get(key)
+            if timestamp is None:
+                cache.add(key, now, timeout=None)
+                timestamp = now
+            modified[collection_id] = timestamp
+            local_modified.set(collection_id, timestamp)
+    return modified
+
+
+def touch_collections(collection_ids) -> None:
+    """
+    Record that images in the collections, their renditions or the collections
+    themselves changed.
+    """
+    collection_ids = {
+        collection_id for collection_id in collection_ids if collection_id is not None
+    }
+    if not collection_ids:
+        return
+    now = time.time()
+    caches[settings.CUSTOM_IMAGES_CACHE_ALIAS].set_many(
+        {get_modified_key(collection_id): now for collection_id in collection_ids},
+        timeout=None,
+    )
+    for collection_id in collection_ids:
+        local_modified.set(collection_id, now)
+
+
+def get_list_cache_key(character: str | None, etag: str) -> str:
+    return f"image-list:{character or ''}:{etag.strip('"')}"
+
+
+def get_cached_list(character: str | None, etag: str) -> bytes | None:
+    """
+    Get the rendered image list with the given ETag, if cached.
+    """
+    return caches[settings.CUSTOM_IMAGES_CACHE_ALIAS].get(
+        get_list_cache_key(character, etag)
+    )
+
+
+def set_cached_list(character: str | None, etag: str, content: bytes) -> None:
+    caches[settings.CUSTOM_IMAGES_CACHE_ALIAS].set(
+        get_list_cache_key(character, etag),
+        content,
+        timeout=settings.CUSTOM_IMAGES_LIST_CACHE_TIMEOUT,
+    )
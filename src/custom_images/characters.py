@@ -0,0 +1,91 @@
+import threading
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from cheminova.cache import SharedVersion
+from experience.models import Character
+
+characters_version = SharedVersion(
+    "characters",
+    cache_alias=settings.CUSTOM_IMAGES_CACHE_ALIAS,
+    local_timeout=settings.CUSTOM_IMAGES_CACHE_VERSION_TIMEOUT,
+)
+
+
+@dataclass(frozen=True)
+class CharacterCollections:
+    slug: str
+    approved_collection_id: int | None
+    not_approved_collection_id: int | None
+
+
+class CharacterRegistry:
+    """
+    In-process map of character slugs to their collections. All characters are
+    loaded with a single query and reloaded once characters_version changes, which
+    custom_images.signals bumps when characters or collections are saved or deleted.
+    """
+
+    def __init__(self):
+        self._characters = {}
+        self._version = None
+        self._lock = threading.Lock()
+
+    def get_all(self) -> dict[str, CharacterCollections]:
+        version = characters_version.get()
+        if self._version != version:
+            with self._lock:
+                if self._version != version:
+                    self._characters = {
+                        character.slug: character
+                        for character in (
+                            CharacterCollections(**values)
+                            for values in Character.objects.exclude(slug=None)
+                            .exclude(slug="")
+                            .values(
+                                "slug",
+                                "approved_collection_id",
+                                "not_approved_collection_id",
+                            )
+                        )
+                    }
+                    self._version = version
+        return self._characters
+
+    def get(self, slug: str) -> CharacterCollections:
+        """
+        Get the collections of the character, raises Character.DoesNotExist for
+        unknown slugs.
+        """
+        try:
+            return self.get_all()[slug]
+        except KeyError:
+            raise Character.DoesNotExist(f"No character with slug {slug!r}") from None
+
+    async def aget(self, slug: str) -> CharacterCollections:
+        """
+        Async version of get. Only loading the characters runs in a thread.
+        """
+        if self._version != await characters_version.aget():
+            await sync_to_async(self.get_all)()
+        try:
+            return self._characters[slug]
+        except KeyError:
+            raise Character.DoesNotExist(f"No character with slug {slug!r}") from None
+
+    def approved_collection_ids(self) -> set[int]:
+        return {
+            character.approved_collection_id
+            for character in self.get_all().values()
+            if character.approved_collection_id is not None
+        }
+
+    def invalidate(self) -> None:
+        characters_version.bump()
+        with self._lock:
+            self._version = None
+
+
+characters = CharacterRegistry()
@@ -0,0 +1,211 @@
+import asyncio
+import json
+from collections import deque
+from collections.abc import AsyncIterator
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from .characters import CharacterCollections, characters
+from .models import ImageEvent
+
+EVENT_FIELDS = ("id", "event", "image_id", "collection_id")
+
+
+def log_image_event(event: str, image_id: int, collection_id: int | None) -> None:
+    """
+    Log an event if the collection is the approved collection of a character, and
+    prune the events older than CUSTOM_IMAGES_EVENTS_RETENTION.
+    """
+    if collection_id not in characters.approved_collection_ids():
+        return
+    ImageEvent.objects.create(
+        event=event, image_id=image_id, collection_id=collection_id
+    )
+    ImageEvent.objects.filter(
+        created_at__lt=timezone.now()
+        - timedelta(seconds=settings.CUSTOM_IMAGES_EVENTS_RETENTION)
+    ).delete()
+
+
+class ImageEventBroadcaster:
+    """
+    Polls the event log for all event streams of a process with a single query per
+    interval and wakes the streams when new events arrive, so idle streams cost no
+    queries. Ids are assigned when events are inserted, not when they commit, so an
+    event may become visible after events with higher ids. Each poll therefore reads
+    the events of the last CUSTOM_IMAGES_EVENTS_SETTLE seconds again, and streams
+    follow the order in which events arrived here, not their ids.
+    """
+
+    def __init__(self, max_events: int = 1000):
+        self.streams = 0
+        # (position, event) in the order the events arrived.
+        self._events = deque(maxlen=max_events)
+        self._loop = None
+
+    def _reset(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._events.clear()
+        self._position = 0
+        self._last_id = None
+        # Creation times of the events that are read again, by id.
+        self._recent = {}
+        self._changed = asyncio.Event()
+        self._task = None
+
+    def get_settled_before(self) -> datetime:
+        return timezone.now() - timedelta(seconds=settings.CUSTOM_IMAGES_EVENTS_SETTLE)
+
+    async def subscribe(self) -> int:
+        """
+        Register a stream and get the position it continues from.
+        """
+        if self._loop is not asyncio.get_running_loop():
+            self._reset()
+        self.streams += 1
+        if self._last_id is None:
+            self._recent = {
+                event["id"]: event["created_at"]
+                async for event in ImageEvent.objects.filter(
+                    created_at__gte=self.get_settled_before()
+                ).values("id", "created_at")
+            }
+            last_id = (await ImageEvent.objects.aaggregate(last_id=Max("id")))[
+                "last_id"
+            ]
+            self._last_id = last_id or 0
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._poll())
+        return self._position
+
+    def unsubscribe(self) -> None:
+        self.streams -= 1
+
+    async def _poll(self) -> None:
+        while self.streams:
+            await asyncio.sleep(settings.CUSTOM_IMAGES_EVENTS_POLL_INTERVAL)
+            settled_before = self.get_settled_before()
+            events = [
+                event
+                async for event in ImageEvent.objects.filter(
+                    Q(id__gt=self._last_id) | Q(created_at__gte=settled_before)
+                )
+                .order_by("id")
+                .values(*EVENT_FIELDS, "created_at")
+                if event["id"] not in self._recent
+            ]
+            self._recent = {
+                event_id: created_at
+                for event_id, created_at in self._recent.items()
+                if created_at >= settled_before
+            }
+            if events:
+                for event in events:
+                    self._recent[event["id"]] = event["created_at"]
+                    self._position += 1
+                    self._events.append((self._position, event))
+                self._last_id = max(self._last_id, events[-1]["id"])
+                changed, self._changed = self._changed, asyncio.Event()
+                changed.set()
+
+    async def wait(self, after: int, timeout: float) -> bool:
+        """
+        Wait until events arrived after the position, at most timeout seconds.
+        """
+        if self._position > after:
+            return True
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except TimeoutError:
+            return False
+        return True
+
+    def get_events(self, collection_id: int, after: int) -> tuple[list[dict], int]:
+        """
+        Get the events of the collection that arrived after the position, and the
+        position to continue from. Returns None instead of the events if some of
+        them were already evicted.
+        """
+        position = self._position
+        if self._events and self._events[0][0] > after + 1:
+            return None, position
+        events = [
+            event
+            for event_position, event in self._events
+            if after < event_position <= position
+            and event["collection_id"] == collection_id
+        ]
+        return events, position
+
+
+broadcaster = ImageEventBroadcaster()
+
+
+async def get_missed_events(
+    collection_id: int, last_event_id: int
+) -> AsyncIterator[dict]:
+    """
+    Get the events of the collection a client missed after last_event_id: the later
+    ones and the earlier ones that may have committed after it, within
+    CUSTOM_IMAGES_EVENTS_SETTLE seconds. The client may receive some events again.
+    """
+    missed = Q(id__gt=last_event_id)
+    last_event = await ImageEvent.objects.filter(id=last_event_id).afirst()
+    if last_event is not None:
+        missed |= Q(
+            id__lt=last_event_id,
+            created_at__gte=last_event.created_at
+            - timedelta(seconds=settings.CUSTOM_IMAGES_EVENTS_SETTLE),
+        )
+    async for event in (
+        ImageEvent.objects.filter(missed, collection_id=collection_id)
+        .order_by("id")
+        .values(*EVENT_FIELDS)
+    ):
+        yield event
+
+
+def format_event(event: dict) -> str:
+    data = json.dumps({"id": event["image_id"]})
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {data}\n\n"
+
+
+async def stream_image_events(
+    character: CharacterCollections, last_event_id: int | None
+) -> AsyncIterator[str]:
+    """
+    Stream the events of the approved collection of the character in the
+    text/event-stream format, after last_event_id or, without it, from now on.
+    Sends a reset event if events after last_event_id were already pruned, clients
+    then refetch the image list. Comments keep idle connections open.
+    """
+    collection_id = character.approved_collection_id
+    position = await broadcaster.subscribe()
+    try:
+        yield f"retry: {settings.CUSTOM_IMAGES_EVENTS_RETRY * 1000}\n\n"
+        if last_event_id is not None:
+            first_id = (await ImageEvent.objects.aaggregate(first_id=Min("id")))[
+                "first_id"
+            ]
+            if first_id is not None and first_id > last_event_id + 1:
+                yield "event: reset\ndata: {}\n\n"
+            else:
+                async for event in get_missed_events(collection_id, last_event_id):
+                    yield format_event(event)
+        while True:
+            if await broadcaster.wait(
+                position, settings.CUSTOM_IMAGES_EVENTS_HEARTBEAT
+            ):
+                events, position = broadcaster.get_events(collection_id, position)
+                if events is None:
+                    yield "event: reset\ndata: {}\n\n"
+                    continue
+                for event in events:
+                    yield format_event(event)
+            else:
+                yield ": keep-alive\n\n"
+    finally:
+        broadcaster.unsubscribe()
@@ -0,0 +1,85 @@
+import hashlib
+from io import BytesIO
+from pathlib import PurePath
+
+import PIL.Image
+import PIL.ImageOps
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+SAVE_OPTIONS = {
+    "JPEG": {"quality": 90},
+    "WEBP": {"quality": 90},
+}
+
+
+def read_header(file) -> tuple[str, int, int]:
+    """
+    Get the format, width and height of an image from its header, without decoding
+    the image data. Raises PIL.UnidentifiedImageError for files that are no images,
+    and PIL.Image.DecompressionBombError for images far beyond Pillow's own limit.
+    """
+    file.seek(0)
+    try:
+        with PIL.Image.open(file) as image:
+            return image.format, image.width, image.height
+    finally:
+        file.seek(0)
+
+
+def downscale(file, max_edge: int) -> SimpleUploadedFile | None:
+    """
+    Downscale an image so that its longer edge is at most max_edge, in the same
+    format. The image is rotated according to its EXIF orientation first and saved
+    without EXIF data. JPEGs are decoded at a reduced scale right away, so large
+    photos never take their full size in memory. Returns None for images that are
+    small enough and for animations.
+    """
+    file.seek(0)
+    with PIL.Image.open(file) as image:
+        image_format = image.format
+        if max(image.size) <= max_edge or getattr(image, "is_animated", False):
+            file.seek(0)
+            return None
+
+        image.draft(image.mode, (max_edge, max_edge))
+        image = PIL.ImageOps.exif_transpose(image)
+        image.thumbnail((max_edge, max_edge), PIL.Image.Resampling.LANCZOS)
+
+        output = BytesIO()
+        image.save(
+            output,
+            image_format,
+            icc_profile=image.info.get("icc_profile"),
+            **SAVE_OPTIONS.get(image_format, {}),
+        )
+    file.seek(0)
+    return SimpleUploadedFile(
+        PurePath(file.name).name,
+        output.getvalue(),
+        content_type=PIL.Image.MIME.get(image_format),
+    )
+
+
+class UploadHashHandler(FileUploadHandler):
+    """
+    Upload handler that computes the SHA-256 of each file while it is received, so
+    the file is not read again. The hex digests are set on request.upload_hashes by
+    field name. Must come before the handlers that store the files.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        request.upload_hashes = {}
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hash = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hash.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        self.request.upload_hashes[self.field_name] = self.hash.hexdigest()
+        return None
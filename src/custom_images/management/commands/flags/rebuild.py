@@ -0,0 +1,17 @@
+from logging import getLogger
+
+from wagtail.images import get_image_model
+
+from custom_images.signals import live_flags_changed
+
+logger = getLogger(__name__)
+
+
+def rebuild_live_flags() -> None:
+    ImageModel = get_image_model()
+
+    changed_ids = ImageModel.objects.all().refresh_live_flags()
+    if changed_ids:
+        live_flags_changed.send(sender=ImageModel, image_ids=changed_ids)
+
+    logger.info(f"Rebuilt live flags, {len(changed_ids)} images were out of date.")
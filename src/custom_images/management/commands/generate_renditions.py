@@ -0,0 +1,26 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from .renditions.schedule import schedule_existing_renditions
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+
+
+class Command(BaseCommand):
+    help = "Queue jobs that generate the missing renditions of existing public images."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Also generate the renditions of images that are not public.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            schedule_existing_renditions(include_private=options["all"])
+        except Exception as e:
+            raise CommandError(f"Error queueing renditions: {e}")
@@ -0,0 +1,19 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from .flags.rebuild import rebuild_live_flags
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+
+
+class Command(BaseCommand):
+    help = "Rebuild the is_live and is_public flags of all images."
+
+    def handle(self, *args, **options):
+        try:
+            rebuild_live_flags()
+        except Exception as e:
+            raise CommandError(f"Error rebuilding live flags: {e}")
@@ -0,0 +1,24 @@
+from logging import getLogger
+
+from custom_images.models import CustomImage
+from custom_images.renditions import schedule_renditions
+
+logger = getLogger(__name__)
+
+
+def schedule_existing_renditions(include_private: bool = False) -> None:
+    """
+    Queue rendition jobs for the existing public images, or all images. The jobs only
+    generate the renditions that do not exist yet, e.g. after the configured filter
+    specs or formats changed.
+    """
+    images = CustomImage.objects.only("pk", "collection_id").order_by("pk")
+    if not include_private:
+        images = images.filter(is_public=True)
+
+    count = 0
+    for image in images.iterator():
+        schedule_renditions(image)
+        count += 1
+
+    logger.info(f"Queued rendition jobs for {count} images.")
@@ -5,7 +5,7 @@ from logging import getLogger
 from django.utils import timezone
 from wagtail.images import get_image_model
 
-from experience.models import Character
+from custom_images.characters import characters
 
 logger = getLogger(__name__)
 
@@ -14,20 +14,12 @@ def randomize_timestamps(character: str, n_days: int = 30) -> None:
     ImageModel = get_image_model()
 
     if character:
-        approved_collections = (
-            Character.objects.filter(slug=character)
-            .values_list("approved_collection_id", flat=True)
-            .distinct()
-        )
+        approved_collections = [characters.get(character).approved_collection_id]
     else:
-        approved_collections = (
-            Character.objects.all()
-            .values_list("approved_collection_id", flat=True)
-            .distinct()
-        )
+        approved_collections = characters.approved_collection_ids()
 
     images_to_randomize = ImageModel.objects.filter(
-        collection_id__in=list(approved_collections)
+        collection_id__in=approved_collections
     )
 
     now = timezone.now()
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.10 on 2026-10-18 07:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("custom_images", "0008_customimage_uploaded_user_name"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="customimage",
+            index=models.Index(fields=["file"], name="custom_imag_file_cd3cfd_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="customrendition",
+            index=models.Index(fields=["file"], name="custom_imag_file_2f1c00_idx"),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.10 on 2026-10-18 08:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("custom_images", "0009_customimage_file_index_customrendition_file_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="customimage",
+            index=models.Index(
+                fields=["collection", "created_at", "id"],
+                name="custom_imag_collect_70d306_idx",
+            ),
+        ),
+    ]
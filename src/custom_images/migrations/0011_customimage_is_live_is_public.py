@@ -0,0 +1,71 @@
+# Generated by Django 5.2.10 on 2026-10-18 08:21
+
+from django.db import migrations, models
+from django.db.models.functions import Cast
+
+
+def set_live_flags(apps, schema_editor):
+    """
+    Compute the flags like CustomImageQuerySet.refresh_live_flags does.
+    """
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    CustomImage = apps.get_model("custom_images", "CustomImage")
+    Character = apps.get_model("experience", "Character")
+    Page = apps.get_model("wagtailcore", "Page")
+    ReferenceIndex = apps.get_model("wagtailcore", "ReferenceIndex")
+
+    image_content_type = ContentType.objects.filter(
+        app_label="custom_images", model="customimage"
+    ).first()
+    page_content_type = ContentType.objects.filter(
+        app_label="wagtailcore", model="page"
+    ).first()
+    if image_content_type is None or page_content_type is None:
+        # A new database without content types has no images either.
+        return
+
+    referenced_by_live_page = models.Exists(
+        ReferenceIndex.objects.filter(
+            to_content_type=image_content_type,
+            to_object_id=Cast(models.OuterRef("pk"), output_field=models.CharField()),
+            base_content_type=page_content_type,
+            object_id__in=Page.objects.filter(live=True).values(
+                page_id=Cast("id", output_field=models.CharField())
+            ),
+        )
+    )
+    in_approved_collection = models.Exists(
+        Character.objects.filter(
+            approved_collection_id=models.OuterRef("collection_id")
+        )
+    )
+    CustomImage.objects.update(
+        is_live=referenced_by_live_page,
+        is_public=models.ExpressionWrapper(
+            models.Q(referenced_by_live_page) | models.Q(in_approved_collection),
+            output_field=models.BooleanField(),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("custom_images", "0010_customimage_collection_created_at_id_index"),
+        ("experience", "0034_alter_imagedescription_locale_and_more"),
+        ("wagtailcore", "0095_groupsitepermission"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customimage",
+            name="is_live",
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name="customimage",
+            name="is_public",
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+        migrations.RunPython(set_live_flags, migrations.RunPython.noop),
+    ]
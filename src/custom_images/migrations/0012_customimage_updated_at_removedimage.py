@@ -0,0 +1,48 @@
+# Generated by Django 5.2.10 on 2026-10-18 08:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("custom_images", "0011_customimage_is_live_is_public"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RemovedImage",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("image_id", models.PositiveIntegerField()),
+                ("collection_id", models.PositiveIntegerField()),
+                ("removed_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="customimage",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name="customimage",
+            index=models.Index(
+                fields=["collection", "updated_at"],
+                name="custom_imag_collect_43c407_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="removedimage",
+            index=models.Index(
+                fields=["collection_id", "removed_at"],
+                name="custom_imag_collect_6a4426_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.10 on 2026-10-18 08:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("custom_images", "0012_customimage_updated_at_removedimage"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImageEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "event",
+                    models.CharField(
+                        choices=[("approved", "Approved"), ("removed", "Removed")],
+                        max_length=20,
+                    ),
+                ),
+                ("image_id", models.PositiveIntegerField()),
+                ("collection_id", models.PositiveIntegerField()),
+                ("created_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["collection_id", "id"],
+                        name="custom_imag_collect_a9344e_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.10 on 2026-10-18 09:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("custom_images", "0013_imageevent"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customimage",
+            name="original_file",
+            field=models.FileField(
+                blank=True, editable=False, upload_to="original_uploads"
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.10 on 2026-10-18 09:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("custom_images", "0014_customimage_original_file"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customimage",
+            name="upload_hash",
+            field=models.CharField(
+                blank=True, db_index=True, default="", editable=False, max_length=64
+            ),
+        ),
+    ]
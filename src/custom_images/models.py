@@ -1,6 +1,85 @@
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
 from django.db import models
-from wagtail.images.models import AbstractImage, AbstractRendition, Image
-from wagtail.models import Page
+from django.db.models.functions import Cast, Now
+from wagtail.images.models import AbstractImage, AbstractRendition, Image, ImageQuerySet
+from wagtail.models import Page, ReferenceIndex
+
+LIVE_FLAG_FIELDS = ("is_live", "is_public")
+
+
+class CustomImageQuerySet(ImageQuerySet):
+    def refresh_live_flags(self) -> list[int]:
+        """
+        Recompute the is_live and is_public flags of the images with set-based
+        queries: one to find the images whose flags are out of date and one UPDATE for
+        them. Returns the ids of the updated images.
+        """
+        changed_ids = list(
+            self.annotate(
+                live_now=referenced_by_live_page(),
+                public_now=is_public_expression(),
+            )
+            .exclude(is_live=models.F("live_now"), is_public=models.F("public_now"))
+            .values_list("pk", flat=True)
+        )
+        if changed_ids:
+            self.model.objects.filter(pk__in=changed_ids).update(
+                is_live=referenced_by_live_page(),
+                is_public=is_public_expression(),
+                updated_at=Now(),
+            )
+        return changed_ids
+
+    def referenced_by_pages(self) -> "CustomImageQuerySet":
+        """
+        Filter the images referenced by any page, live or not.
+        """
+        return self.filter(
+            pk__in=ReferenceIndex.objects.filter(
+                to_content_type=ContentType.objects.get_for_model(CustomImage),
+                base_content_type=ContentType.objects.get_for_model(Page),
+            ).values(image_id=Cast("to_object_id", output_field=models.IntegerField()))
+        )
+
+
+def referenced_by_live_page() -> models.Exists:
+    """
+    Expression that is true for images referenced by a live page.
+    """
+    return models.Exists(
+        ReferenceIndex.objects.filter(
+            to_content_type=ContentType.objects.get_for_model(CustomImage),
+            to_object_id=Cast(models.OuterRef("pk"), output_field=models.CharField()),
+            base_content_type=ContentType.objects.get_for_model(Page),
+            object_id__in=Page.objects.live().values(
+                page_id=Cast("id", output_field=models.CharField())
+            ),
+        )
+    )
+
+
+def in_approved_collection() -> models.Exists:
+    """
+    Expression that is true for images in the approved collection of a character.
+    """
+    Character = apps.get_model("experience", "Character")
+    return models.Exists(
+        Character.objects.filter(
+            approved_collection_id=models.OuterRef("collection_id")
+        )
+    )
+
+
+def is_public_expression() -> models.ExpressionWrapper:
+    """
+    Expression that is true for images everybody may view: referenced by a live page
+    or in the approved collection of a character.
+    """
+    return models.ExpressionWrapper(
+        models.Q(referenced_by_live_page()) | models.Q(in_approved_collection()),
+        output_field=models.BooleanField(),
+    )
 
 
 class CustomImage(AbstractImage):
@@ -14,14 +93,68 @@ class CustomImage(AbstractImage):
         max_length=150,
         default="",
     )
+    # Denormalized from the reference index, pages and characters, kept up to date by
+    # custom_images.signals and rebuilt by the rebuild_live_flags command.
+    is_live = models.BooleanField(default=False, db_index=True, editable=False)
+    is_public = models.BooleanField(default=False, db_index=True, editable=False)
+    # The upload before it was downscaled, if CUSTOM_IMAGES_UPLOAD_KEEP_ORIGINAL is set.
+    # Not an image path, so image-auth never serves it.
+    original_file = models.FileField(
+        upload_to="original_uploads", blank=True, editable=False
+    )
+    # SHA-256 of the upload as it was received, before it was downscaled, to find
+    # repeated uploads, see ImageViewSet.create.
+    upload_hash = models.CharField(
+        max_length=64, blank=True, default="", db_index=True, editable=False
+    )
+    # Time of the last change of anything in the image list, for the delta feed.
+    updated_at = models.DateTimeField(auto_now=True)
     admin_form_fields = Image.admin_form_fields + (
         "uploaded_text",
         "uploaded_user_name",
     )
 
+    objects = CustomImageQuerySet.as_manager()
+
+    class Meta(AbstractImage.Meta):
+        indexes = [
+            models.Index(fields=["file"]),
+            models.Index(fields=["collection", "created_at", "id"]),
+            models.Index(fields=["collection", "updated_at"]),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_collection_id = instance.__dict__.get("collection_id")
+        return instance
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if not self._state.adding and update_fields is None:
+            # The live flags are only written by refresh_live_flags, saving an image
+            # loaded before they changed must not write them back.
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in LIVE_FLAG_FIELDS
+            ]
+        elif update_fields:
+            kwargs["update_fields"] = {*update_fields, "updated_at"}
+        super().save(*args, **kwargs)
+        self.loaded_collection_id = self.collection_id
+
+    def collection_changed(self) -> bool:
+        """
+        Whether the image was moved to another collection since it was loaded or
+        last saved.
+        """
+        return getattr(self, "loaded_collection_id", None) != self.collection_id
+
     def get_referenced_live_pages(self) -> list[Page]:
         """
-        Get all referenced live pages that are using this image.
+        Get all referenced live pages that are using this image. To only check
+        whether the image is live, use is_live.
         """
         return [
             reference_index[0]
@@ -37,3 +170,48 @@ class CustomRendition(AbstractRendition):
 
     class Meta:
         unique_together = (("image", "filter_spec", "focal_point_key"),)
+        indexes = [
+            models.Index(fields=["file"]),
+        ]
+
+
+class RemovedImage(models.Model):
+    """
+    Log of images removed from a collection, by deleting them or moving them to
+    another collection, for the delta feed of the image list. Entries older than
+    CUSTOM_IMAGES_REMOVED_IMAGES_RETENTION are pruned.
+    """
+
+    image_id = models.PositiveIntegerField()
+    # Not a foreign key, deleting a collection deletes its images and logs them.
+    collection_id = models.PositiveIntegerField()
+    removed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["collection_id", "removed_at"]),
+        ]
+
+
+class ImageEvent(models.Model):
+    """
+    Log of images approved, i.e. added to the approved collection of a character, and
+    removed from it, streamed to installation screens by custom_images.events. The id
+    is the event id clients resume from. Entries older than
+    CUSTOM_IMAGES_EVENTS_RETENTION are pruned.
+    """
+
+    APPROVED = "approved"
+    REMOVED = "removed"
+    EVENT_CHOICES = [(APPROVED, "Approved"), (REMOVED, "Removed")]
+
+    event = models.CharField(max_length=20, choices=EVENT_CHOICES)
+    image_id = models.PositiveIntegerField()
+    # Not a foreign key, like RemovedImage.collection_id.
+    collection_id = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["collection_id", "id"]),
+        ]
@@ -0,0 +1,15 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ImageCursorPagination(CursorPagination):
+    """
+    Cursor pagination over images, newest first, for infinite scroll. Each page is a
+    range scan of the (collection, created_at, id) index, so fetching a page does not
+    get slower the further a client scrolls. Pagination is opt-in through the
+    page_size query parameter, clients that omit it get the complete list.
+    """
+
+    ordering = ("-created_at", "-id")
+    page_size = None
+    page_size_query_param = "page_size"
+    max_page_size = 100
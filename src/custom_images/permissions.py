@@ -0,0 +1,79 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AbstractBaseUser, AnonymousUser
+from django.core.cache import caches
+from wagtail.images import get_image_model
+from wagtail.images.models import Image
+from wagtail.permission_policies.collections import CollectionPermissionPolicy
+
+from cheminova.cache import SharedVersion
+
+IMAGE_ACTIONS = ["change", "add", "delete", "choose"]
+
+permissions_version = SharedVersion(
+    "image-collection-permissions",
+    cache_alias=settings.CUSTOM_IMAGES_CACHE_ALIAS,
+    local_timeout=settings.CUSTOM_IMAGES_CACHE_VERSION_TIMEOUT,
+)
+
+
+def get_image_collection_ids(user: AbstractBaseUser | AnonymousUser) -> frozenset:
+    """
+    Get the ids of all collections in which the user may change, add, delete or
+    choose images. The result is memoized on the user object for the request and
+    cached per user until permissions_version is bumped.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+
+    collection_ids = getattr(user, "_image_collection_ids", None)
+    if collection_ids is not None:
+        return collection_ids
+
+    cache = caches[settings.CUSTOM_IMAGES_CACHE_ALIAS]
+    key = f"image-collection-permissions:{user.pk}"
+    version = permissions_version.get()
+    collection_ids = cache.get(key, version=version)
+    if collection_ids is None:
+        permission_policy = CollectionPermissionPolicy(
+            get_image_model(), auth_model=Image
+        )
+        collection_ids = frozenset(
+            permission_policy.collections_user_has_any_permission_for(
+                user, IMAGE_ACTIONS
+            ).values_list("pk", flat=True)
+        )
+        cache.set(
+            key,
+            collection_ids,
+            timeout=settings.CUSTOM_IMAGES_PERMISSIONS_CACHE_TIMEOUT,
+            version=version,
+        )
+
+    user._image_collection_ids = collection_ids
+    return collection_ids
+
+
+async def aget_image_collection_ids(
+    user: AbstractBaseUser | AnonymousUser,
+) -> frozenset:
+    """
+    Async version of get_image_collection_ids. Only the permission query on a cache
+    miss runs in a thread.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+
+    collection_ids = getattr(user, "_image_collection_ids", None)
+    if collection_ids is not None:
+        return collection_ids
+
+    collection_ids = await caches[settings.CUSTOM_IMAGES_CACHE_ALIAS].aget(
+        f"image-collection-permissions:{user.pk}",
+        version=await permissions_version.aget(),
+    )
+    if collection_ids is None:
+        return await sync_to_async(get_image_collection_ids)(user)
+
+    user._image_collection_ids = collection_ids
+    return collection_ids
@@ -0,0 +1,108 @@
+from django.conf import settings
+
+from jobs.decorators import job
+
+from .characters import characters
+from .models import CustomImage
+
+
+def get_filter_specs(collection_id: int | None) -> list[str]:
+    """
+    Get the filter specs of the renditions of the images in a collection: the srcset
+    widths and the filter specs configured in CUSTOM_IMAGES_RENDITIONS for all images
+    ("*") and for the characters the collection belongs to.
+    """
+    filter_specs = dict.fromkeys(
+        [
+            *get_srcset_filter_specs(),
+            *settings.CUSTOM_IMAGES_RENDITIONS.get("*", []),
+        ]
+    )
+    for slug, character in characters.get_all().items():
+        if collection_id in (
+            character.approved_collection_id,
+            character.not_approved_collection_id,
+        ):
+            filter_specs.update(
+                dict.fromkeys(settings.CUSTOM_IMAGES_RENDITIONS.get(slug, []))
+            )
+    return [
+        *filter_specs,
+        *(
+            f"{filter_spec}|format-{image_format}"
+            for filter_spec in filter_specs
+            for image_format in settings.CUSTOM_IMAGES_RENDITION_FORMATS
+        ),
+    ]
+
+
+def get_srcset_filter_specs() -> list[str]:
+    """
+    Get the filter specs of the srcset renditions, one per CUSTOM_IMAGES_SRCSET_WIDTHS.
+    Wagtail does not upscale, images narrower than a width keep their own width.
+    """
+    return [f"width-{width}" for width in settings.CUSTOM_IMAGES_SRCSET_WIDTHS]
+
+
+def get_rendition_format(request) -> str | None:
+    """
+    Get the format of the renditions for a request, one of
+    CUSTOM_IMAGES_RENDITION_FORMATS: the image_format query parameter, or else the
+    first of the formats the Accept header lists explicitly, e.g.
+    "application/json, image/avif, image/webp". Wildcards do not count, every client
+    accepts */*. None means the renditions in the format of the image.
+    """
+    image_format = request.GET.get("image_format")
+    if image_format is not None:
+        return (
+            image_format
+            if image_format in settings.CUSTOM_IMAGES_RENDITION_FORMATS
+            else None
+        )
+    accepted = {
+        media_type.sub_type
+        for media_type in request.accepted_types
+        if media_type.main_type == "image" and media_type.quality > 0
+    }
+    for image_format in settings.CUSTOM_IMAGES_RENDITION_FORMATS:
+        if image_format in accepted:
+            return image_format
+    return None
+
+
+def select_renditions(renditions, image_format: str | None) -> list:
+    """
+    Select one rendition per filter spec: the one converted to image_format if it
+    exists, or else the one in the format of the image.
+    """
+    selected = {}
+    for rendition in renditions:
+        filter_spec, _, rendition_format = rendition.filter_spec.partition("|format-")
+        if rendition_format == (image_format or ""):
+            selected[filter_spec] = rendition
+        elif not rendition_format:
+            selected.setdefault(filter_spec, rendition)
+    return list(selected.values())
+
+
+@job(priority=10)
+def generate_renditions(image_id: int, filter_specs: list[str]) -> None:
+    """
+    Generate the renditions of an image that do not exist yet.
+    """
+    try:
+        image = CustomImage.objects.get(pk=image_id)
+    except CustomImage.DoesNotExist:
+        return
+    image.get_renditions(*filter_specs)
+
+
+def schedule_renditions(image: CustomImage) -> None:
+    """
+    Queue a job that generates the configured renditions of the image, in its own
+    format and in CUSTOM_IMAGES_RENDITION_FORMATS, so that visitors only ever get
+    existing renditions.
+    """
+    filter_specs = get_filter_specs(image.collection_id)
+    if filter_specs:
+        generate_renditions.enqueue(image.pk, filter_specs)
@@ -1,20 +1,94 @@
 import uuid
 from pathlib import PurePath
 
+import PIL.Image
 from django.conf import settings
 from rest_framework import serializers
 
+from image_auth.signing import sign_media_url
+
+from .ingest import downscale, read_header
 from .models import CustomImage
+from .renditions import (
+    get_rendition_format,
+    get_srcset_filter_specs,
+    select_renditions,
+)
+
+
+def media_url(url: str, image: CustomImage) -> str:
+    """
+    Sign a media URL of a public image, if enabled. Media of other images stay behind
+    the image-auth check, a signed URL would serve them to anyone it is passed on to.
+    """
+    return sign_media_url(url) if image.is_public else url
+
+
+class SignedImageField(serializers.ImageField):
+    def to_representation(self, value):
+        url = super().to_representation(value)
+        return media_url(url, value.instance) if url else url
+
+
+def rendition_url(rendition, image: CustomImage) -> str:
+    return media_url(settings.WAGTAILADMIN_BASE_URL + rendition.file.url, image)
+
+
+class RenditionsField(serializers.Field):
+    """
+    The URLs of an image's renditions, in the format negotiated for the request if
+    they were generated in it, see custom_images.renditions.get_rendition_format.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def get_renditions(self, value) -> list:
+        request = self.context.get("request")
+        image_format = get_rendition_format(request) if request else None
+        return select_renditions(value.all(), image_format)
+
+    def to_representation(self, value):
+        return [
+            rendition_url(rendition, value.instance)
+            for rendition in self.get_renditions(value)
+        ]
 
 
-class RenditionFileField(serializers.RelatedField):
+class SrcsetField(RenditionsField):
+    """
+    The renditions of an image in CUSTOM_IMAGES_SRCSET_WIDTHS, narrowest first, with
+    their width and height. The width is the descriptor of the srcset entry, e.g.
+    srcset="<url> 320w, <url> 640w". Widths the image is narrower than are left out,
+    apart from one rendition in its own width.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("source", "renditions")
+        super().__init__(**kwargs)
+
     def to_representation(self, value):
-        return settings.WAGTAILADMIN_BASE_URL + value.file.url
+        filter_specs = set(get_srcset_filter_specs())
+        renditions_by_width = {}
+        for rendition in self.get_renditions(value):
+            if rendition.filter_spec.partition("|format-")[0] in filter_specs:
+                renditions_by_width.setdefault(rendition.width, rendition)
+        return [
+            {
+                "url": rendition_url(rendition, value.instance),
+                "width": rendition.width,
+                "height": rendition.height,
+            }
+            for _, rendition in sorted(renditions_by_width.items())
+        ]
 
 
 class CustomImageModelSerializer(serializers.ModelSerializer):
-    renditions = RenditionFileField(many=True, read_only=True)
-    live = serializers.SerializerMethodField()
+    file = SignedImageField(read_only=True)
+    renditions = RenditionsField()
+    srcset = SrcsetField()
+    live = serializers.BooleanField(source="is_live", read_only=True)
     collection = serializers.CharField(source="collection.name", read_only=True)
 
     class Meta:
@@ -23,7 +97,10 @@ class CustomImageModelSerializer(serializers.ModelSerializer):
             "id",
             "title",
             "file",
+            "width",
+            "height",
             "renditions",
+            "srcset",
             "live",
             "collection",
             "uploaded_text",
@@ -32,24 +109,70 @@ class CustomImageModelSerializer(serializers.ModelSerializer):
         ]
         depth = 0
 
-    def get_live(self, obj: CustomImage) -> bool:
-        return len(obj.get_referenced_live_pages()) > 0
-
 
 class SaveImageModelSerializer(serializers.ModelSerializer):
+    original_file = serializers.FileField(required=False, write_only=True)
+    upload_hash = serializers.CharField(
+        required=False, allow_blank=True, write_only=True
+    )
+
     class Meta:
         model = CustomImage
-        fields = ["file", "title", "collection", "uploaded_text", "uploaded_user_name"]
+        fields = [
+            "file",
+            "original_file",
+            "upload_hash",
+            "title",
+            "collection",
+            "uploaded_text",
+            "uploaded_user_name",
+        ]
 
 
 class ImageFieldWithUniqueName(serializers.ImageField):
+    """
+    Image upload field that checks the format and size of images before they are
+    decoded, and downscales them to CUSTOM_IMAGES_UPLOAD_MAX_EDGE.
+    """
+
+    default_error_messages = {
+        "unsupported_format": "Unsupported image format {format}.",
+        "too_many_pixels": "The image has more than {max_pixels} pixels.",
+    }
+
     def to_internal_value(self, data):
+        if hasattr(data, "read"):
+            self.validate_header(data)
         file = super().to_internal_value(data)
+        original_file = None
         if file:
             original_name = file.name
             file_path = PurePath(original_name)
             file.name = file_path.stem + f"-{uuid.uuid4()}" + file_path.suffix
-        return {"file": file, "title": original_name}
+            max_edge = settings.CUSTOM_IMAGES_UPLOAD_MAX_EDGE
+            downscaled_file = downscale(file, max_edge) if max_edge else None
+            if downscaled_file is not None:
+                if settings.CUSTOM_IMAGES_UPLOAD_KEEP_ORIGINAL:
+                    original_file = file
+                file = downscaled_file
+        return {"file": file, "title": original_name, "original_file": original_file}
+
+    def validate_header(self, data) -> None:
+        try:
+            image_format, width, height = read_header(data)
+        except PIL.Image.DecompressionBombError:
+            self.fail(
+                "too_many_pixels", max_pixels=settings.CUSTOM_IMAGES_UPLOAD_MAX_PIXELS
+            )
+        except (PIL.UnidentifiedImageError, OSError):
+            # Left to ImageField, which rejects invalid images.
+            return
+        if image_format not in settings.CUSTOM_IMAGES_UPLOAD_FORMATS:
+            self.fail("unsupported_format", format=image_format)
+        if width * height > settings.CUSTOM_IMAGES_UPLOAD_MAX_PIXELS:
+            self.fail(
+                "too_many_pixels", max_pixels=settings.CUSTOM_IMAGES_UPLOAD_MAX_PIXELS
+            )
 
 
 class ImageUploadRequestSerializer(serializers.Serializer):
@@ -59,9 +182,12 @@ class ImageUploadRequestSerializer(serializers.Serializer):
 
     def to_internal_value(self, data):
         ret = super().to_internal_value(data)
-        return {
+        internal_value = {
             "file": ret["image"]["file"],
             "title": ret["image"]["title"],
             "uploaded_text": ret.get("text", ""),
             "uploaded_user_name": ret.get("userName", ""),
         }
+        if ret["image"]["original_file"] is not None:
+            internal_value["original_file"] = ret["image"]["original_file"]
+        return internal_value
@@ -0,0 +1,292 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Now
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+from django_tasks import TaskResultStatus
+from django_tasks.signals import task_finished
+from wagtail.models import Collection, GroupCollectionPermission, Page
+from wagtail.signals import page_published, page_unpublished
+from wagtail.tasks import update_reference_index_task
+
+from experience.models import Character
+
+from .cache import touch_collections
+from .characters import characters
+from .events import log_image_event
+from .models import (
+    LIVE_FLAG_FIELDS,
+    CustomImage,
+    CustomImageQuerySet,
+    ImageEvent,
+    RemovedImage,
+)
+from .permissions import permissions_version
+from .renditions import schedule_renditions
+
+# Sent with the ids of the images whose is_live or is_public flag changed, and
+# whether they were just created.
+live_flags_changed = Signal()
+# Sent with the images moved to another collection without being saved, as loaded
+# before the move, and the id of their new collection.
+images_moved = Signal()
+
+
+@receiver(post_save, sender=Collection)
+@receiver(post_delete, sender=Collection)
+@receiver(post_save, sender=GroupCollectionPermission)
+@receiver(post_delete, sender=GroupCollectionPermission)
+@receiver(post_delete, sender=Group)
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_image_collection_permissions(**kwargs) -> None:
+    """
+    Collection permissions apply to descendant collections, so new and moved
+    collections change them as well as permission and group changes.
+    """
+    permissions_version.bump()
+
+
+@receiver(post_save, sender=User)
+def invalidate_image_collection_permissions_on_user_save(
+    update_fields: frozenset | None, **kwargs
+) -> None:
+    """
+    Active and superuser flags change the permissions, logging in does not.
+    """
+    if update_fields != frozenset({"last_login"}):
+        permissions_version.bump()
+
+
+def refresh_live_flags(images: CustomImageQuerySet, created: bool = False) -> None:
+    changed_ids = images.refresh_live_flags()
+    if changed_ids:
+        live_flags_changed.send(
+            sender=CustomImage, image_ids=changed_ids, created=created
+        )
+
+
+def refresh_page_image_flags() -> None:
+    """
+    Pages only make the images they reference live, so only these and the images
+    that are live now need to be checked.
+    """
+    refresh_live_flags(
+        CustomImage.objects.filter(
+            Q(is_live=True) | Q(pk__in=CustomImage.objects.referenced_by_pages())
+        )
+    )
+
+
+@receiver(page_published)
+@receiver(page_unpublished)
+@receiver(post_delete, sender=Page)
+def refresh_live_flags_on_page_change(**kwargs) -> None:
+    """
+    References are removed and updated when the transaction is committed.
+    """
+    transaction.on_commit(refresh_page_image_flags)
+
+
+@receiver(task_finished)
+def refresh_live_flags_on_reference_index_update(task_result, **kwargs) -> None:
+    if (
+        task_result.task.module_path == update_reference_index_task.module_path
+        and task_result.status == TaskResultStatus.SUCCEEDED
+    ):
+        refresh_page_image_flags()
+
+
+@receiver(post_save, sender=CustomImage)
+def refresh_live_flags_on_image_save(
+    instance: CustomImage, created: bool, **kwargs
+) -> None:
+    """
+    New images and images moved to another collection may be in an approved
+    collection.
+    """
+    if created or instance.collection_changed():
+        refresh_live_flags(CustomImage.objects.filter(pk=instance.pk), created=created)
+        instance.refresh_from_db(fields=LIVE_FLAG_FIELDS)
+
+
+@receiver(images_moved)
+def refresh_live_flags_on_images_moved(images: list[CustomImage], **kwargs) -> None:
+    refresh_live_flags(
+        CustomImage.objects.filter(pk__in=[image.pk for image in images])
+    )
+
+
+@receiver(post_save, sender=Character)
+@receiver(post_delete, sender=Character)
+@receiver(post_delete, sender=Collection)
+def invalidate_characters(**kwargs) -> None:
+    """
+    Deleting a collection removes it from characters without saving them. Other
+    processes may reload the characters before the transaction is committed, so
+    they are invalidated again on commit.
+    """
+    characters.invalidate()
+    transaction.on_commit(characters.invalidate)
+
+
+@receiver(post_save, sender=Character)
+@receiver(post_delete, sender=Character)
+def refresh_live_flags_on_character_change(instance: Character, **kwargs) -> None:
+    """
+    The approved collection of the character may have changed, which affects the
+    images in it and all images that are public now.
+    """
+    refresh_live_flags(
+        CustomImage.objects.filter(
+            Q(is_public=True) | Q(collection_id=instance.approved_collection_id)
+        )
+    )
+
+
+@receiver(post_save, sender=CustomImage)
+@receiver(post_delete, sender=CustomImage)
+def touch_image_collections(instance: CustomImage, **kwargs) -> None:
+    """
+    A moved image changes the lists of its old and new collection.
+    """
+    touch_collections(
+        [instance.collection_id, getattr(instance, "loaded_collection_id", None)]
+    )
+
+
+@receiver(images_moved)
+def touch_moved_images_collections(
+    images: list[CustomImage], collection_id: int, **kwargs
+) -> None:
+    touch_collections([collection_id, *{image.collection_id for image in images}])
+
+
+@receiver(post_save, sender=CustomImage.get_rendition_model())
+@receiver(post_delete, sender=CustomImage.get_rendition_model())
+def touch_rendition_collection(instance, **kwargs) -> None:
+    touch_collections(
+        CustomImage.objects.filter(pk=instance.image_id).values_list(
+            "collection_id", flat=True
+        )
+    )
+
+
+@receiver(post_save, sender=Collection)
+def touch_collection(instance: Collection, **kwargs) -> None:
+    """
+    Image lists contain the collection name.
+    """
+    touch_collections([instance.pk])
+
+
+@receiver(live_flags_changed)
+def touch_collections_on_live_flags_change(image_ids: list[int], **kwargs) -> None:
+    touch_collections(
+        CustomImage.objects.filter(pk__in=image_ids)
+        .values_list("collection_id", flat=True)
+        .distinct()
+    )
+
+
+def log_removed_image(image_id: int, collection_id: int) -> None:
+    """
+    Log the removal for the delta feed and prune entries that delta requests no
+    longer accept.
+    """
+    RemovedImage.objects.create(image_id=image_id, collection_id=collection_id)
+    RemovedImage.objects.filter(
+        removed_at__lt=timezone.now()
+        - timedelta(seconds=settings.CUSTOM_IMAGES_REMOVED_IMAGES_RETENTION)
+    ).delete()
+
+
+@receiver(post_save, sender=CustomImage)
+def log_moved_image(instance: CustomImage, created: bool, **kwargs) -> None:
+    """
+    Moderators approve images by moving them to the approved collection.
+    """
+    if created:
+        log_image_event(ImageEvent.APPROVED, instance.pk, instance.collection_id)
+    elif instance.collection_changed():
+        log_removed_image(instance.pk, instance.loaded_collection_id)
+        log_image_event(ImageEvent.REMOVED, instance.pk, instance.loaded_collection_id)
+        log_image_event(ImageEvent.APPROVED, instance.pk, instance.collection_id)
+
+
+@receiver(images_moved)
+def log_moved_images(images: list[CustomImage], collection_id: int, **kwargs) -> None:
+    for image in images:
+        log_removed_image(image.pk, image.collection_id)
+        log_image_event(ImageEvent.REMOVED, image.pk, image.collection_id)
+        log_image_event(ImageEvent.APPROVED, image.pk, collection_id)
+
+
+@receiver(post_delete, sender=CustomImage)
+def log_deleted_image(instance: CustomImage, **kwargs) -> None:
+    log_removed_image(instance.pk, instance.collection_id)
+    log_image_event(ImageEvent.REMOVED, instance.pk, instance.collection_id)
+
+
+@receiver(post_save, sender=CustomImage.get_rendition_model())
+@receiver(post_delete, sender=CustomImage.get_rendition_model())
+def update_rendition_image(instance, **kwargs) -> None:
+    """
+    Image lists contain the renditions, the delta feed must return the image again.
+    """
+    CustomImage.objects.filter(pk=instance.image_id).update(updated_at=Now())
+
+
+@receiver(images_moved)
+def update_moved_images(images: list[CustomImage], **kwargs) -> None:
+    """
+    Saving an image updates it, the delta feed must return moved images again.
+    """
+    CustomImage.objects.filter(pk__in=[image.pk for image in images]).update(
+        updated_at=Now()
+    )
+
+
+@receiver(post_save, sender=Collection)
+def update_collection_images(instance: Collection, created: bool, **kwargs) -> None:
+    """
+    Image lists contain the collection name.
+    """
+    if not created:
+        CustomImage.objects.filter(collection=instance).update(updated_at=Now())
+
+
+@receiver(post_save, sender=CustomImage)
+def generate_image_renditions(instance: CustomImage, created: bool, **kwargs) -> None:
+    """
+    Renditions are generated for new images, uploaded by visitors or editors, and
+    again for approved images, which are shown in the gallery and may have
+    character specific ones.
+    """
+    if created or (
+        instance.collection_changed()
+        and instance.collection_id in characters.approved_collection_ids()
+    ):
+        schedule_renditions(instance)
+
+
+@receiver(images_moved)
+def generate_moved_image_renditions(
+    images: list[CustomImage], collection_id: int, **kwargs
+) -> None:
+    if collection_id in characters.approved_collection_ids():
+        for image in CustomImage.objects.filter(pk__in=[image.pk for image in images]):
+            schedule_renditions(image)
+
+
+@receiver(post_delete, sender=CustomImage)
+def delete_original_file(instance: CustomImage, **kwargs) -> None:
+    """
+    Like Wagtail does for the image file, once the deletion is committed.
+    """
+    if instance.original_file:
+        transaction.on_commit(lambda: instance.original_file.delete(save=False))
@@ -0,0 +1,718 @@
+import json
+from datetime import timedelta
+from io import BytesIO
+from pathlib import Path
+from unittest import mock
+
+import PIL.Image
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission, User
+from django.contrib.contenttypes.models import ContentType
+from django.core.files.images import ImageFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from wagtail.images import get_image_model
+from wagtail.images.models import Image
+from wagtail.models import Collection, GroupCollectionPermission, Page
+
+from experience.models import Character, Characters, Welcome
+from jobs.models import Job
+
+from .models import ImageEvent
+from .renditions import schedule_renditions
+
+# The shared cache is Redis in production. Tests of query counts use a local cache,
+# so that they count the database queries only, not the fallback cache table.
+LOCAL_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+def get_test_image_file(filename="test.png", colour="white", size=(64, 48)):
+    f = BytesIO()
+    image = PIL.Image.new("RGBA", size, colour)
+    image.save(f, "PNG")
+    return ImageFile(f, name=filename)
+
+
+class ImageViewSetTests(APITestCase):
+    def setUp(self):
+        CustomImage = get_image_model()
+        root_collection = Collection.get_first_root_node()
+        self.approved_collection = root_collection.add_child(name="Approved")
+        self.not_approved_collection = root_collection.add_child(name="Not Approved")
+
+        characters = Characters(title="Test Characters")
+        Page.objects.get(slug="root").add_child(instance=characters)
+        self.character = Character.objects.create(
+            name="Test Character",
+            slug="test-character",
+            page=characters,
+            approved_collection=self.approved_collection,
+            not_approved_collection=self.not_approved_collection,
+        )
+        self.url = reverse(
+            "customimage-character", kwargs={"character": self.character.slug}
+        ).replace(settings.BASE_PATH, "/")
+
+        now = timezone.now()
+        self.not_approved_image = CustomImage.objects.create(
+            title="Test Image Not Approved",
+            file=get_test_image_file(filename="test-not-approved.png"),
+            collection=self.not_approved_collection,
+        )
+        self.images = [
+            CustomImage.objects.create(
+                title=f"Test Image {i}",
+                file=get_test_image_file(filename=f"test-{i}.png"),
+                collection=self.approved_collection,
+            )
+            for i in range(5)
+        ]
+        # The last two images share their creation time, the id breaks the tie.
+        for i, image in enumerate(self.images):
+            image.created_at = now - timedelta(minutes=min(i, 3))
+            image.save()
+        # Tests that need renditions queue them with their own settings.
+        Job.objects.all().delete()
+
+    def tearDown(self):
+        for image in [*self.images, self.not_approved_image]:
+            path = Path(settings.MEDIA_ROOT).joinpath(str(image.file))
+            if path.exists():
+                path.unlink()
+            image.delete()
+
+    def test_list_unpaginated(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), len(self.images))
+
+    def test_list_media_urls_stable_on_moderation(self):
+        response = self.client.get(self.url)
+        files = {image["id"]: image["file"] for image in response.data}
+
+        # Media URLs stay cacheable, image-auth decides on every request.
+        self.images[0].collection = self.not_approved_collection
+        self.images[0].save()
+        response = self.client.get(self.url)
+        for image in response.data:
+            self.assertEqual(image["file"], files[image["id"]])
+            self.assertNotIn("?", image["file"])
+
+    @override_settings(MEDIA_URL_SIGNING_SECRET="secret")
+    def test_list_signs_public_media_urls_only(self):
+        self.images[0].get_rendition("fill-20x20")
+        self.not_approved_image.get_rendition("fill-20x20")
+        admin = User.objects.create_superuser(username="admin", password="password")
+        self.client.force_login(admin)
+        response = self.client.get(self.url)
+        images = {image["id"]: image for image in response.json()}
+
+        public_image = images[self.images[0].id]
+        self.assertIn("md5=", public_image["file"])
+        self.assertIn("md5=", public_image["renditions"][0])
+        # Private media stay behind the image-auth check.
+        private_image = images[self.not_approved_image.id]
+        self.assertNotIn("md5=", private_image["file"])
+        self.assertNotIn("md5=", private_image["renditions"][0])
+
+    def test_list_cursor_pagination(self):
+        expected_ids = [image.id for image in self.images[:3]] + sorted(
+            [image.id for image in self.images[3:]], reverse=True
+        )
+        ids = []
+        url = f"{self.url}?page_size=2"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data["results"]), 2)
+            ids.extend(image["id"] for image in response.data["results"])
+            next_url = response.data["next"]
+            url = next_url.replace(settings.BASE_PATH, "/") if next_url else None
+        self.assertEqual(ids, expected_ids)
+
+    def publish_welcome_page(self, background_image) -> Welcome:
+        welcome = Welcome(
+            title="Welcome", slug="welcome", background_image=background_image
+        )
+        Page.objects.get(slug="root").add_child(instance=welcome)
+        # The reference index and the live flags of images are updated on commit.
+        with self.captureOnCommitCallbacks(execute=True):
+            welcome.save_revision().publish()
+        return welcome
+
+    def test_list_constant_query_count(self):
+        self.publish_welcome_page(self.images[0])
+        self.images.extend([image.get_rendition("width-40") for image in self.images])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual(
+            [
+                image["live"]
+                for image in response.data
+                if image["id"] == self.images[0].id
+            ],
+            [True],
+        )
+        self.assertTrue(all(len(image["renditions"]) == 1 for image in response.data))
+
+        CustomImage = get_image_model()
+        for i in range(5, 10):
+            image = CustomImage.objects.create(
+                title=f"Test Image {i}",
+                file=get_test_image_file(filename=f"test-{i}.png"),
+                collection=self.approved_collection,
+            )
+            self.images.extend([image, image.get_rendition("width-40")])
+
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data), 10)
+
+    def test_live_flags_follow_publishing(self):
+        welcome = self.publish_welcome_page(self.not_approved_image)
+        self.not_approved_image.refresh_from_db()
+        self.assertTrue(self.not_approved_image.is_live)
+        self.assertTrue(self.not_approved_image.is_public)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            welcome.unpublish()
+        self.not_approved_image.refresh_from_db()
+        self.assertFalse(self.not_approved_image.is_live)
+        self.assertFalse(self.not_approved_image.is_public)
+
+    def test_live_flags_follow_collections(self):
+        self.assertTrue(get_image_model().objects.get(pk=self.images[0].pk).is_public)
+        self.assertFalse(self.not_approved_image.is_public)
+
+        self.not_approved_image.collection = self.approved_collection
+        self.not_approved_image.save()
+        self.not_approved_image.refresh_from_db()
+        self.assertTrue(self.not_approved_image.is_public)
+
+        self.character.approved_collection = self.not_approved_collection
+        self.character.save()
+        self.assertFalse(
+            get_image_model()
+            .objects.filter(collection=self.approved_collection, is_public=True)
+            .exists()
+        )
+
+    def test_rebuild_live_flags(self):
+        CustomImage = get_image_model()
+        CustomImage.objects.update(is_public=False)
+        call_command("rebuild_live_flags")
+        self.assertEqual(
+            CustomImage.objects.filter(is_public=True).count(), len(self.images)
+        )
+
+    def test_list_conditional_get(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response.headers["ETag"]
+        last_modified = response.headers["Last-Modified"]
+
+        # Only the aggregate, the character comes from the registry.
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.headers["ETag"], etag)
+        # Changes within the same second have the same Last-Modified.
+        response = self.client.get(
+            self.url, headers={"If-Modified-Since": last_modified}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Other pages have other validators.
+        response = self.client.get(
+            f"{self.url}?page_size=2", headers={"If-None-Match": etag}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # The URLs in the list are absolute.
+        with self.settings(ALLOWED_HOSTS=["testserver", "other.testserver"]):
+            response = self.client.get(
+                self.url, headers={"If-None-Match": etag, "Host": "other.testserver"}
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("other.testserver", response.data[0]["file"])
+
+        self.images[0].title = "Changed"
+        self.images[0].save()
+        response = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+    def test_list_validators_include_renditions(self):
+        # The first rendition saves the file metadata of the image.
+        self.images[0].get_rendition("fill-20x20")
+        response = self.client.get(self.url)
+        etag = response.headers["ETag"]
+
+        # The worker's cache touch may not reach the web processes, the database
+        # records the rendition as well.
+        with mock.patch("custom_images.signals.touch_collections"):
+            self.images[0].get_rendition("fill-10x10")
+        response = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+    @override_settings(CACHES=LOCAL_CACHES)
+    def test_list_response_cache(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        content = response.content
+
+        # Only the aggregate, no list queries.
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.content, content)
+        self.assertEqual(response.headers["Content-Type"], "application/json")
+
+        self.not_approved_image.collection = self.approved_collection
+        self.not_approved_image.save()
+        response = self.client.get(self.url)
+        self.assertIn(
+            self.not_approved_image.id, [image["id"] for image in response.json()]
+        )
+
+    def test_list_response_cache_private_images(self):
+        response = self.client.get(self.url)
+        self.assertNotIn(
+            self.not_approved_image.id, [image["id"] for image in response.json()]
+        )
+
+        editor = User.objects.create_user(username="editor", password="password")
+        editors = Group.objects.create(name="Gallery editors")
+        GroupCollectionPermission.objects.create(
+            group=editors,
+            collection=self.not_approved_collection,
+            permission=Permission.objects.get(
+                content_type=ContentType.objects.get_for_model(Image),
+                codename="change_image",
+            ),
+        )
+        editor.groups.add(editors)
+        self.client.force_login(editor)
+        response = self.client.get(self.url)
+        self.assertIn(
+            self.not_approved_image.id, [image["id"] for image in response.json()]
+        )
+
+        self.client.logout()
+        response = self.client.get(self.url)
+        self.assertNotIn(
+            self.not_approved_image.id, [image["id"] for image in response.json()]
+        )
+
+    @override_settings(CUSTOM_IMAGES_DELTA_OVERLAP=0)
+    def test_delta(self):
+        response = self.client.get(self.url, {"since": timezone.now().isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["images"], [])
+        self.assertEqual(response.data["removed"], [])
+        since = response.data["next"]
+
+        new_image = get_image_model().objects.create(
+            title="Test Image New",
+            file=get_test_image_file(filename="test-new.png"),
+            collection=self.approved_collection,
+        )
+        self.images.append(new_image)
+        moved_image = self.images[0]
+        moved_image.collection = self.not_approved_collection
+        moved_image.save()
+        deleted_image = self.images.pop(1)
+        deleted_image_id = deleted_image.id
+        deleted_image.delete()
+        Path(settings.MEDIA_ROOT).joinpath(str(deleted_image.file)).unlink()
+
+        response = self.client.get(self.url, {"since": since})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [image["id"] for image in response.data["images"]], [new_image.id]
+        )
+        self.assertEqual(
+            response.data["removed"], sorted([moved_image.id, deleted_image_id])
+        )
+
+        response = self.client.get(self.url, {"since": response.data["next"]})
+        self.assertEqual(response.data["images"], [])
+        self.assertEqual(response.data["removed"], [])
+
+    @override_settings(CUSTOM_IMAGES_DELTA_OVERLAP=0)
+    def test_delta_bulk_move(self):
+        response = self.client.get(self.url, {"since": timezone.now().isoformat()})
+        since = response.data["next"]
+
+        editor = User.objects.create_user(username="editor", password="password")
+        editors = Group.objects.create(name="Gallery editors")
+        GroupCollectionPermission.objects.create(
+            group=editors,
+            collection=self.not_approved_collection,
+            permission=Permission.objects.get(
+                content_type=ContentType.objects.get_for_model(Image),
+                codename="change_image",
+            ),
+        )
+        editor.groups.add(editors)
+        self.client.force_login(editor)
+        etag = self.client.get(self.url).headers["ETag"]
+
+        # The bulk action updates the images without saving them.
+        CustomImage = get_image_model()
+        bulk_action_url = reverse(
+            "wagtail_bulk_action",
+            args=(
+                CustomImage._meta.app_label,
+                CustomImage._meta.model_name,
+                "add_to_collection",
+            ),
+        )
+        moved_image = self.images[0]
+        self.client.force_login(
+            User.objects.create_superuser(username="admin", password="password")
+        )
+        response = self.client.post(
+            f"{bulk_action_url}?id={moved_image.pk}",
+            {"collection": self.not_approved_collection.pk},
+        )
+        self.assertEqual(response.status_code, 302)
+
+        # The editor list contains both collections, only the image changed.
+        self.client.force_login(editor)
+        response = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+        self.client.logout()
+        response = self.client.get(self.url, {"since": since})
+        self.assertEqual(response.data["images"], [])
+        self.assertEqual(response.data["removed"], [moved_image.id])
+        self.assertTrue(
+            ImageEvent.objects.filter(
+                event=ImageEvent.REMOVED, image_id=moved_image.id
+            ).exists()
+        )
+
+    def test_delta_overlap(self):
+        get_image_model().objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        response = self.client.get(self.url, {"since": timezone.now().isoformat()})
+        since = response.data["next"]
+        # An image saved before the previous delta and committed after it.
+        late_image = self.images[0]
+        get_image_model().objects.filter(pk=late_image.pk).update(
+            updated_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        response = self.client.get(self.url, {"since": since})
+        self.assertEqual(
+            [image["id"] for image in response.data["images"]], [late_image.id]
+        )
+
+    def test_delta_invalid_and_expired_cursor(self):
+        response = self.client.get(self.url, {"since": "yesterday"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        since = timezone.now() - timedelta(
+            seconds=settings.CUSTOM_IMAGES_REMOVED_IMAGES_RETENTION + 60
+        )
+        response = self.client.get(self.url, {"since": since.timestamp()})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+    @override_settings(CUSTOM_IMAGES_EVENTS_POLL_INTERVAL=0.01)
+    async def test_image_events(self):
+        events_url = reverse(
+            "customimage-events", kwargs={"character": self.character.slug}
+        ).replace(settings.BASE_PATH, "/")
+        response = await self.async_client.get(events_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.headers["Content-Type"], "text/event-stream")
+        events = aiter(response.streaming_content)
+        self.assertTrue((await anext(events)).startswith(b"retry: "))
+
+        self.not_approved_image.collection = self.approved_collection
+        await sync_to_async(self.not_approved_image.save)()
+        event = await ImageEvent.objects.alatest("id")
+        data = json.dumps({"id": self.not_approved_image.id})
+        self.assertEqual(
+            await anext(events),
+            f"id: {event.id}\nevent: approved\ndata: {data}\n\n".encode(),
+        )
+        await events.aclose()
+
+        # Resume after the events of the images created in setUp. The earlier events
+        # may have committed later and are sent again.
+        response = await self.async_client.get(
+            events_url, headers={"Last-Event-ID": str(event.id - 2)}
+        )
+        events = aiter(response.streaming_content)
+        await anext(events)
+        event_ids = []
+        while event.id not in event_ids:
+            chunk = (await anext(events)).decode()
+            self.assertIn("event: approved", chunk)
+            event_ids.append(int(chunk.split("\n")[0].removeprefix("id: ")))
+        self.assertIn(event.id - 1, event_ids)
+        await events.aclose()
+
+    @override_settings(CUSTOM_IMAGES_EVENTS_POLL_INTERVAL=0.01)
+    async def test_image_events_committed_out_of_order(self):
+        events_url = reverse(
+            "customimage-events", kwargs={"character": self.character.slug}
+        ).replace(settings.BASE_PATH, "/")
+        # An event with an earlier id whose transaction is still open.
+        late_event = await ImageEvent.objects.order_by("id").afirst()
+        late_event_id = late_event.id
+        await late_event.adelete()
+
+        response = await self.async_client.get(events_url)
+        events = aiter(response.streaming_content)
+        await anext(events)
+        self.not_approved_image.collection = self.approved_collection
+        await sync_to_async(self.not_approved_image.save)()
+        self.assertIn(b"event: approved", await anext(events))
+
+        await ImageEvent.objects.acreate(
+            id=late_event_id,
+            event=late_event.event,
+            image_id=late_event.image_id,
+            collection_id=late_event.collection_id,
+        )
+        late_chunk = await anext(events)
+        self.assertTrue(late_chunk.startswith(f"id: {late_event_id}\n".encode()))
+        await events.aclose()
+
+    def test_image_events_need_asgi(self):
+        events_url = reverse(
+            "customimage-events", kwargs={"character": self.character.slug}
+        ).replace(settings.BASE_PATH, "/")
+        response = self.client.get(events_url)
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    async def test_image_events_not_found(self):
+        response = await self.async_client.get("/api/images/unknown/events/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_character_registry(self):
+        self.client.get(self.url)
+        other_collection = Collection.get_first_root_node().add_child(name="Other")
+        self.character.approved_collection = other_collection
+        self.character.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [])
+
+        self.character.delete()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(
+        CUSTOM_IMAGES_RENDITIONS={"*": ["fill-10x10"], "test-character": ["max-20x20"]},
+        CUSTOM_IMAGES_RENDITION_FORMATS=[],
+        CUSTOM_IMAGES_SRCSET_WIDTHS=[],
+    )
+    def test_renditions_generated_on_upload_and_approval(self):
+        upload = get_test_image_file(filename="test-upload.png")
+        upload.seek(0)
+        response = self.client.post(self.url, {"image": upload}, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        image = get_image_model().objects.latest("pk")
+        self.images.append(image)
+        self.assertFalse(image.renditions.exists())
+        call_command("run_worker", "--burst", "--pool", "inline")
+        renditions = list(image.renditions.all())
+        self.images.extend(renditions)
+        self.assertEqual(
+            {rendition.filter_spec for rendition in renditions},
+            {"fill-10x10", "max-20x20"},
+        )
+
+        image.renditions.all().delete()
+        image.collection = self.approved_collection
+        image.save()
+        call_command("run_worker", "--burst", "--pool", "inline")
+        renditions = list(image.renditions.all())
+        self.images.extend(renditions)
+        self.assertEqual(len(renditions), 2)
+
+    @override_settings(
+        CUSTOM_IMAGES_RENDITIONS={"*": ["fill-10x10"]},
+        CUSTOM_IMAGES_RENDITION_FORMATS=[],
+        CUSTOM_IMAGES_SRCSET_WIDTHS=[],
+    )
+    def test_generate_renditions_command(self):
+        call_command("generate_renditions")
+        self.assertEqual(Job.objects.count(), len(self.images))
+        call_command("run_worker", "--burst", "--pool", "inline")
+        for image in list(self.images):
+            renditions = list(image.renditions.all())
+            self.images.extend(renditions)
+            self.assertEqual(
+                [rendition.filter_spec for rendition in renditions], ["fill-10x10"]
+            )
+        self.assertFalse(self.not_approved_image.renditions.exists())
+
+        call_command("generate_renditions", "--all")
+        call_command("run_worker", "--burst", "--pool", "inline")
+        self.images.extend(self.not_approved_image.renditions.all())
+        self.assertTrue(self.not_approved_image.renditions.exists())
+
+    @override_settings(
+        CUSTOM_IMAGES_RENDITIONS={"*": ["fill-10x10"]},
+        CUSTOM_IMAGES_RENDITION_FORMATS=["avif", "webp"],
+        CUSTOM_IMAGES_SRCSET_WIDTHS=[],
+    )
+    def test_rendition_formats(self):
+        image = self.images[0]
+        schedule_renditions(image)
+        call_command("run_worker", "--burst", "--pool", "inline")
+        renditions = list(image.renditions.all())
+        self.images.extend(renditions)
+        self.assertEqual(
+            {rendition.filter_spec for rendition in renditions},
+            {"fill-10x10", "fill-10x10|format-avif", "fill-10x10|format-webp"},
+        )
+
+        def get_rendition_urls(**kwargs):
+            response = self.client.get(self.url, **kwargs)
+            self.assertIn("Accept", response["Vary"])
+            return next(
+                data["renditions"]
+                for data in json.loads(response.content)
+                if data["id"] == image.pk
+            )
+
+        (url,) = get_rendition_urls()
+        self.assertIn(".png", url)
+        (url,) = get_rendition_urls(headers={"Accept": "application/json, image/webp"})
+        self.assertIn(".webp", url)
+        (url,) = get_rendition_urls(
+            headers={"Accept": "application/json, image/webp, image/avif"}
+        )
+        self.assertIn(".avif", url)
+        (url,) = get_rendition_urls(
+            headers={"Accept": "application/json, image/avif;q=0, image/*"}
+        )
+        self.assertIn(".png", url)
+        (url,) = get_rendition_urls(
+            data={"image_format": "webp"},
+            headers={"Accept": "application/json, image/avif"},
+        )
+        self.assertIn(".webp", url)
+
+    @override_settings(
+        CUSTOM_IMAGES_RENDITIONS={},
+        CUSTOM_IMAGES_RENDITION_FORMATS=["webp"],
+        CUSTOM_IMAGES_SRCSET_WIDTHS=[16, 32, 100, 200],
+    )
+    def test_srcset(self):
+        image = self.images[0]
+        schedule_renditions(image)
+        call_command("run_worker", "--burst", "--pool", "inline")
+        self.images.extend(image.renditions.all())
+
+        response = self.client.get(self.url, headers={"Accept": "image/webp, */*"})
+        data = next(data for data in response.data if data["id"] == image.pk)
+        self.assertEqual((data["width"], data["height"]), (64, 48))
+        # The image is narrower than 100 and 200, it is listed once in its own width.
+        self.assertEqual(
+            [(entry["width"], entry["height"]) for entry in data["srcset"]],
+            [(16, 12), (32, 24), (64, 48)],
+        )
+        self.assertTrue(all(".webp" in entry["url"] for entry in data["srcset"]))
+
+    def upload(
+        self, image: PIL.Image.Image, image_format: str, filename: str, **kwargs
+    ):
+        f = BytesIO()
+        image.save(f, image_format, **kwargs)
+        f.seek(0)
+        f.name = filename
+        return self.client.post(self.url, {"image": f}, format="multipart")
+
+    def get_uploaded_image(self):
+        image = get_image_model().objects.latest("pk")
+        self.images.append(image)
+        return image
+
+    @override_settings(CUSTOM_IMAGES_UPLOAD_MAX_EDGE=100)
+    def test_upload_downscaled(self):
+        response = self.upload(PIL.Image.new("RGB", (400, 200)), "JPEG", "big.jpg")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        image = self.get_uploaded_image()
+        self.assertEqual((image.width, image.height), (100, 50))
+        self.assertTrue(image.file.name.endswith(".jpg"))
+        self.assertFalse(image.original_file)
+
+        # Portrait photo stored in landscape with an EXIF orientation.
+        exif = PIL.Image.Exif()
+        exif[0x0112] = 6
+        response = self.upload(
+            PIL.Image.new("RGB", (400, 200)), "JPEG", "rotated.jpg", exif=exif
+        )
+        image = self.get_uploaded_image()
+        self.assertEqual((image.width, image.height), (50, 100))
+
+        response = self.upload(PIL.Image.new("RGB", (80, 60)), "PNG", "small.png")
+        image = self.get_uploaded_image()
+        self.assertEqual((image.width, image.height), (80, 60))
+
+    @override_settings(
+        CUSTOM_IMAGES_UPLOAD_MAX_EDGE=100, CUSTOM_IMAGES_UPLOAD_KEEP_ORIGINAL=True
+    )
+    def test_upload_keep_original(self):
+        response = self.upload(PIL.Image.new("RGB", (400, 200)), "PNG", "big.png")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        image = self.get_uploaded_image()
+        self.assertEqual(image.width, 100)
+        with image.original_file.open() as f, PIL.Image.open(f) as original:
+            self.assertEqual(original.size, (400, 200))
+        image.original_file.delete(save=False)
+
+    def test_upload_repeated(self):
+        response = self.upload(PIL.Image.new("RGB", (20, 10)), "PNG", "kiosk.png")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        image = self.get_uploaded_image()
+        self.assertEqual(len(image.upload_hash), 64)
+
+        response = self.upload(PIL.Image.new("RGB", (20, 10)), "PNG", "kiosk.png")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["file"], image.file.url)
+        self.assertEqual(response["Location"], image.file.url)
+        self.assertEqual(get_image_model().objects.latest("pk"), image)
+
+        # Other texts are other submissions.
+        f = BytesIO()
+        PIL.Image.new("RGB", (20, 10)).save(f, "PNG")
+        f.seek(0)
+        f.name = "kiosk.png"
+        response = self.client.post(
+            self.url, {"image": f, "text": "Other"}, format="multipart"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.get_uploaded_image()
+
+        # Uploads after the window are stored again.
+        created_at = timezone.now() - timedelta(hours=1)
+        get_image_model().objects.filter(pk=image.pk).update(created_at=created_at)
+        response = self.upload(PIL.Image.new("RGB", (20, 10)), "PNG", "kiosk.png")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotEqual(self.get_uploaded_image(), image)
+
+    @override_settings(CUSTOM_IMAGES_UPLOAD_MAX_PIXELS=10_000)
+    def test_upload_rejected_before_decoding(self):
+        response = self.upload(PIL.Image.new("RGB", (200, 100)), "PNG", "big.png")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("image", response.data)
+
+        response = self.upload(PIL.Image.new("RGB", (20, 10)), "TIFF", "small.tiff")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Unsupported image format TIFF.", response.data["image"])
@@ -1,6 +1,7 @@
+from django.urls import path
 from rest_framework.routers import Route, SimpleRouter
 
-from custom_images.views import ImageViewSet
+from custom_images.views import ImageViewSet, image_events
 
 
 class CustomRouter(SimpleRouter):
@@ -28,4 +29,6 @@ class CustomRouter(SimpleRouter):
 
 router = CustomRouter()
 router.register("images", ImageViewSet)
-urlpatterns = router.urls
+urlpatterns = router.urls + [
+    path("images/<slug:character>/events/", image_events, name="customimage-events"),
+]
@@ -1,12 +1,37 @@
+import hashlib
+import math
+from datetime import UTC, datetime, timedelta
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Count, Max, Prefetch
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import BasePermission, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 from wagtail.images import get_image_model
-from wagtail.images.models import Image
-from wagtail.permission_policies.collections import CollectionPermissionPolicy
 
 from experience.models import Character
+from image_auth.signing import get_expires
 
+from .cache import get_cached_list, get_collections_modified, set_cached_list
+from .characters import CharacterCollections, characters
+from .events import stream_image_events
+from .ingest import UploadHashHandler
+from .models import CustomImage, RemovedImage
+from .pagination import ImageCursorPagination
+from .permissions import get_image_collection_ids
+from .renditions import get_rendition_format
 from .serializers import (
     CustomImageModelSerializer,
     ImageUploadRequestSerializer,
@@ -26,64 +51,275 @@ class AllowCharacterImages(BasePermission):
 class ImageViewSet(ModelViewSet):
     """
     A viewset for listing and uploading custom images associated with characters.
+    Lists are paginated with a cursor if the page_size query parameter is given.
+    With the since parameter, only the changes after the cursor are listed.
     """
 
     permission_classes = [IsAuthenticated | AllowCharacterImages]
     serializer_class = CustomImageModelSerializer
+    pagination_class = ImageCursorPagination
     queryset = get_image_model().objects.all()
     lookup_url_kwarg = "character"
 
-    def get_queryset(self):
+    def get_collection_ids(self) -> list[int]:
+        """
+        Get the ids of the collections whose images the user may list.
+        """
         character = self.kwargs.get(self.lookup_url_kwarg)
-        allowed_collections = []
-        if self.request.user.is_authenticated:
-            permission_policy = CollectionPermissionPolicy(
-                get_image_model(), auth_model=Image
-            )
-            allowed_collections.extend(
-                list(
-                    permission_policy.collections_user_has_any_permission_for(
-                        self.request.user, ["change", "add", "delete", "choose"]
-                    )
+        allowed_collections = get_image_collection_ids(self.request.user)
+
+        if character is not None:
+            character_instance = self.get_character(character)
+            collections = [character_instance.approved_collection_id]
+            if character_instance.not_approved_collection_id in allowed_collections:
+                collections.append(character_instance.not_approved_collection_id)
+            return collections
+
+        return sorted(allowed_collections)
+
+    def get_queryset(self):
+        queryset = self.queryset.filter(collection_id__in=self.get_collection_ids())
+        if self.action == "list":
+            return self.get_list_queryset(queryset)
+        return queryset
+
+    def get_list_queryset(self, queryset):
+        """
+        Fetch everything CustomImageModelSerializer needs in a fixed number of
+        queries: the images with their collection, and their renditions.
+        Width and height are loaded because Django fills them in on load otherwise.
+        """
+        RenditionModel = get_image_model().get_rendition_model()
+        return (
+            queryset.select_related("collection")
+            .prefetch_related(
+                Prefetch(
+                    "renditions",
+                    queryset=RenditionModel.objects.only(
+                        "id", "image_id", "filter_spec", "file", "width", "height"
+                    ),
                 )
             )
+            .only(
+                "id",
+                "title",
+                "file",
+                "width",
+                "height",
+                "is_live",
+                "is_public",
+                "collection__name",
+                "uploaded_text",
+                "uploaded_user_name",
+                "created_at",
+            )
+        )
 
-        if character is not None:
-            character_instance = Character.objects.get(slug=character)
-            collections = [character_instance.approved_collection]
-            if character_instance.not_approved_collection in allowed_collections:
-                collections.append(character_instance.not_approved_collection)
-            return self.queryset.filter(collection__in=collections)
+    def get_character(self, slug: str) -> CharacterCollections:
+        return characters.get(slug)
 
-        return self.queryset.filter(collection__in=allowed_collections)
+    def get_list_validators(self) -> tuple[str, float]:
+        """
+        Get the ETag and the last modification time of the list without serializing
+        it. Besides the images, the list depends on the collections the user may see,
+        the requested page and format, the rendition format, the media URL parameters
+        and the scheme and host of the absolute URLs in it.
+        """
+        collection_ids = self.get_collection_ids()
+        collections_modified = get_collections_modified(collection_ids)
+        images = self.queryset.filter(collection_id__in=collection_ids).aggregate(
+            count=Count("id"), last_updated_at=Max("updated_at")
+        )
+        last_modified = max(
+            [
+                *collections_modified.values(),
+                *([images["last_updated_at"].timestamp()] if images["count"] else []),
+            ],
+            default=0.0,
+        )
+        etag = hashlib.md5(
+            repr(
+                (
+                    sorted(collections_modified.items()),
+                    images["count"],
+                    images["last_updated_at"],
+                    self.request.build_absolute_uri("/"),
+                    sorted(self.request.query_params.lists()),
+                    self.request.accepted_renderer.format,
+                    get_rendition_format(self.request),
+                    get_expires() if settings.MEDIA_URL_SIGNING_SECRET else None,
+                )
+            ).encode()
+        ).hexdigest()
+        return f'"{etag}"', last_modified
 
     def list(self, request, *args, **kwargs):
         character = kwargs.get(self.lookup_url_kwarg)
         if character is not None:
             try:
-                Character.objects.get(slug=character)
-                return super().list(request, *args, **kwargs)
-
+                self.get_character(character)
             except Character.DoesNotExist:
                 return Response(data={"error": "Character not found"}, status=404)
 
-        return super().list(request, *args, **kwargs)
+        # Display walls poll the list, answer with 304 if nothing changed. Only the
+        # ETag is compared, Last-Modified has a resolution of seconds.
+        etag, last_modified = self.get_list_validators()
+        response = get_conditional_response(request, etag=etag)
+        if response is None and "since" in request.query_params:
+            response = self.delta()
+        if response is None:
+            response = self.get_cached_list_response(character, etag)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+            if self.cache_list():
+                response.add_post_render_callback(
+                    lambda rendered: set_cached_list(character, etag, rendered.content)
+                )
+        response.headers["ETag"] = etag
+        response.headers["Last-Modified"] = http_date(math.ceil(last_modified))
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ["Accept", "Cookie"])
+        return response
+
+    def get_since(self) -> datetime:
+        """
+        Parse the since parameter, a timestamp as returned in the next field of a
+        delta response or an ISO 8601 datetime.
+        """
+        value = self.request.query_params["since"]
+        try:
+            return datetime.fromtimestamp(float(value), tz=UTC)
+        except (ValueError, OverflowError):
+            pass
+        try:
+            since = parse_datetime(value)
+        except ValueError:
+            since = None
+        if since is None:
+            raise ValidationError({"since": "Invalid timestamp."})
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since, UTC)
+        return since
+
+    def delta(self) -> Response:
+        """
+        List the images created or changed after since and the ids of the images
+        removed from the listed collections since then. Both queries use indexes on
+        the collection and the time, so their cost follows the number of changes.
+        Removals are only logged for CUSTOM_IMAGES_REMOVED_IMAGES_RETENTION, older
+        cursors get a 410 and must refetch the whole list. Changes within
+        CUSTOM_IMAGES_DELTA_OVERLAP before the request are sent again by the next
+        delta, clients apply them by id.
+        """
+        since = self.get_since()
+        now = timezone.now()
+        retention = timedelta(seconds=settings.CUSTOM_IMAGES_REMOVED_IMAGES_RETENTION)
+        if since < now - retention:
+            return Response(data={"error": "Cursor expired"}, status=410)
+
+        images = list(
+            self.get_queryset()
+            .filter(updated_at__gt=since)
+            .order_by("updated_at", "id")
+        )
+        # Images moved between listed collections are changed, not removed.
+        removed = (
+            RemovedImage.objects.filter(
+                collection_id__in=self.get_collection_ids(), removed_at__gt=since
+            )
+            .exclude(image_id__in=[image.pk for image in images])
+            .values_list("image_id", flat=True)
+            .distinct()
+        )
+        next_since = now - timedelta(seconds=settings.CUSTOM_IMAGES_DELTA_OVERLAP)
+        return Response(
+            data={
+                "next": f"{next_since.timestamp():.6f}",
+                "images": self.get_serializer(images, many=True).data,
+                "removed": sorted(removed),
+            }
+        )
+
+    def cache_list(self) -> bool:
+        """
+        Only whole JSON lists are cached, delta cursors are rarely requested twice.
+        """
+        return (
+            self.request.accepted_renderer.format == "json"
+            and "since" not in self.request.query_params
+        )
+
+    def get_cached_list_response(
+        self, character: str | None, etag: str
+    ) -> HttpResponse | None:
+        """
+        Get the cached JSON of the list. The ETag covers the collections the user may
+        see, so users with different permissions never share an entry, and changes
+        to the listed images change the ETag.
+        """
+        if not self.cache_list():
+            return None
+        content = get_cached_list(character, etag)
+        if content is None:
+            return None
+        return HttpResponse(content, content_type="application/json")
+
+    def initial(self, request, *args, **kwargs):
+        if self.action == "create":
+            # Before the authentication, which may parse the request for CSRF checks.
+            request.upload_handlers.insert(0, UploadHashHandler(request._request))
+        super().initial(request, *args, **kwargs)
+
+    def get_duplicate_upload(
+        self, character: CharacterCollections, upload_hash: str
+    ) -> CustomImage | None:
+        """
+        Get the image of the character uploaded with the same file, text and user name
+        within CUSTOM_IMAGES_UPLOAD_DEDUP_WINDOW seconds, e.g. by a kiosk that retried
+        an upload it got no response for.
+        """
+        window = settings.CUSTOM_IMAGES_UPLOAD_DEDUP_WINDOW
+        if window is None or not upload_hash:
+            return None
+        return (
+            CustomImage.objects.filter(
+                upload_hash=upload_hash,
+                collection_id__in=[
+                    character.not_approved_collection_id,
+                    character.approved_collection_id,
+                ],
+                created_at__gte=timezone.now() - timedelta(seconds=window),
+                uploaded_text=self.request.data.get("text", ""),
+                uploaded_user_name=self.request.data.get("userName", ""),
+            )
+            .order_by("-created_at")
+            .first()
+        )
 
     def create(self, request, *args, **kwargs):
         character = kwargs.get(self.lookup_url_kwarg)
         try:
-            character_instance = Character.objects.get(slug=character)
+            character_instance = self.get_character(character)
         except Character.DoesNotExist:
             return Response(data={"error": "Character not found"}, status=404)
 
+        # Parses the request, which computes the upload hash.
         request_serializer = ImageUploadRequestSerializer(data=request.data)
+        upload_hash = getattr(request, "upload_hashes", {}).get("image", "")
+
+        # Checked before the upload is decoded, a repeated upload costs no more work.
+        duplicate = self.get_duplicate_upload(character_instance, upload_hash)
+        if duplicate is not None:
+            data = SaveImageModelSerializer(duplicate).data
+            return Response(data=data, status=200, headers={"Location": data["file"]})
 
         if not request_serializer.is_valid():
             return Response(data=request_serializer.errors, status=400)
 
         data = {
             **request_serializer.validated_data,
-            "collection": character_instance.not_approved_collection.pk,
+            "collection": character_instance.not_approved_collection_id,
+            "upload_hash": upload_hash,
         }
 
         image_serializer = SaveImageModelSerializer(data=data)
@@ -101,3 +337,36 @@ class ImageViewSet(ModelViewSet):
                 data={**image_serializer.errors, "error": "Image upload failed"},
                 status=400,
             )
+
+
+@require_GET
+async def image_events(request, character: str):
+    """
+    Stream the images approved for and removed from the character as server-sent
+    events. Streams are idle most of the time and must be served by an ASGI server.
+    Under WSGI, Django reads the whole stream before sending anything, which would
+    block a worker forever, so they are refused.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {"error": "Image events are only served by the ASGI server"}, status=503
+        )
+
+    try:
+        character_instance = await characters.aget(character)
+    except Character.DoesNotExist:
+        return JsonResponse({"error": "Character not found"}, status=404)
+
+    try:
+        last_event_id = int(request.headers["Last-Event-ID"])
+    except (KeyError, ValueError):
+        last_event_id = None
+
+    response = StreamingHttpResponse(
+        stream_image_events(character_instance, last_event_id),
+        content_type="text/event-stream",
+    )
+    response.headers["Cache-Control"] = "no-cache"
+    # Tell nginx to pass events on immediately.
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,22 @@
+from wagtail import hooks
+
+from .models import CustomImage
+from .signals import images_moved
+
+
+@hooks.register("after_bulk_action")
+def send_images_moved(request, action_type, objects, action_class_instance):
+    """
+    The bulk action that adds images to a collection updates them without saving
+    them, so the post_save receivers of moved images do not run.
+    """
+    if action_type != "add_to_collection":
+        return
+    if action_class_instance.model is not CustomImage:
+        return
+    collection_id = action_class_instance.cleaned_form.cleaned_data["collection"].pk
+    images = [image for image in objects if image.collection_id != collection_id]
+    if images:
+        images_moved.send(
+            sender=CustomImage, images=images, collection_id=collection_id
+        )
@@ -1,13 +1,16 @@
 import urllib
+from collections import defaultdict
 
 from caseutil import to_camel, to_kebab, to_snake
 from django.conf import settings
 from django.db import models
+from django.db.models import prefetch_related_objects
 from modelcluster.models import get_all_child_relations
 from rest_framework import serializers
 from wagtail.images import get_image_model
 
 import experience.models as experience_models
+from custom_images.serializers import RenditionsField, SignedImageField, SrcsetField
 
 
 def absolute_url(relative_url: str) -> str:
@@ -63,10 +66,44 @@ def to_snake_case_data(data: dict) -> dict:
     return {to_snake(key): value for key, value in data.items()}
 
 
+def get_image_field_names(model: type[models.Model]) -> list[str]:
+    return [
+        field.name
+        for field in model._meta.get_fields()
+        if isinstance(field, models.fields.related.ForeignKey)
+        and field.related_model == get_image_model()
+    ]
+
+
+def get_image_prefetches(model: type[models.Model]) -> list[str]:
+    """
+    Lookups that fetch the images of a model with their renditions, which
+    ImageModelSerializer needs, in two queries per image field.
+    """
+    return [f"{name}__renditions" for name in get_image_field_names(model)]
+
+
+def get_live_children(page: models.Model) -> list:
+    """
+    Get the live children of a page as their specific pages, with their images.
+    """
+    children = list(page.get_children().live().specific())
+    children_by_model = defaultdict(list)
+    for child in children:
+        children_by_model[type(child)].append(child)
+    for model, model_children in children_by_model.items():
+        prefetch_related_objects(model_children, *get_image_prefetches(model))
+    return children
+
+
 class ImageModelSerializer(serializers.ModelSerializer):
+    file = SignedImageField(read_only=True)
+    renditions = RenditionsField()
+    srcset = SrcsetField()
+
     class Meta:
         model = get_image_model()
-        fields = ["file"]
+        fields = ["file", "width", "height", "renditions", "srcset"]
 
 
 class CamelCaseMixin:
@@ -86,7 +123,7 @@ class BrowsablePageModelSerializer(CamelCaseMixin, serializers.ModelSerializer):
         return f"{absolute_url(settings.API_BASE_URL + endpoint(obj) + f'/{obj.id}')}{query_params_string(self.context)}"
 
     def get_children_urls(self, obj: models.Model) -> list:
-        children = obj.get_children().live().specific()
+        children = get_live_children(obj)
         children_urls = [
             data.get("selfUrl")
             for data in [get_serialized_data(child, self.context) for child in children]
@@ -101,11 +138,11 @@ class BrowsablePageModelSerializer(CamelCaseMixin, serializers.ModelSerializer):
             if self.context["iteration"] >= int(query_params.get("depth")):
                 return self.get_children_urls(obj)
             else:
-                children = obj.get_children().live().specific()
+                children = get_live_children(obj)
                 self.context.update(iteration=self.context.get("iteration", 0) + 1)
                 return [get_serialized_data(child, self.context) for child in children]
         else:
-            children = obj.get_children().live().specific()
+            children = get_live_children(obj)
             return [get_serialized_data(child, self.context) for child in children]
 
 
@@ -206,13 +243,9 @@ def create_model_serializer(model_name: str):
         "children",
         "selfUrl",
     ]
-    image_field_names = [
-        field.name
-        for field in serializer_model._meta.get_fields()
-        if isinstance(field, models.fields.related.ForeignKey)
-        and field.related_model == get_image_model()
-    ]
-    image_fields = {name: ImageModelSerializer() for name in image_field_names}
+    image_fields = {
+        name: ImageModelSerializer() for name in get_image_field_names(serializer_model)
+    }
     model_cluster_relations = [
         (
             relation.related_name,
@@ -250,5 +283,6 @@ for model_name in experience_models.__all__:
 class QueryParamsSerializer(serializers.Serializer):
     depth = serializers.IntegerField(required=False)
     format = serializers.CharField(required=False)
+    image_format = serializers.CharField(required=False)
     locale = serializers.CharField(required=False)
     browsable = serializers.CharField(required=False)
@@ -1,3 +1,4 @@
+from django.utils.cache import patch_vary_headers
 from rest_framework.viewsets import ReadOnlyModelViewSet
 from wagtail.models import Locale
 
@@ -28,6 +29,12 @@ class QueryParametersMixin:
         context.update(query_params=query_params)
         return context
 
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        # Image renditions are in the format the Accept header asks for.
+        patch_vary_headers(response, ["Accept"])
+        return response
+
 
 class FilterLocaleMixin:
     """
@@ -81,7 +88,9 @@ def create_model_viewset(model_name):
     """
     serializer_class = getattr(experience_serializers, f"{model_name}ModelSerializer")
     model = getattr(experience_models, model_name)
-    queryset = model.objects.all()
+    queryset = model.objects.prefetch_related(
+        *experience_serializers.get_image_prefetches(model)
+    )
     mixins = (QueryParametersMixin, FilterLocaleMixin)
 
     return type(
@@ -97,7 +106,9 @@ def create_model_viewset(model_name):
 class AllModelViewSet(QueryParametersMixin, FilterLocaleMixin, ReadOnlyModelViewSet):
     serializer_class = getattr(experience_serializers, "WelcomeLanguageModelSerializer")
     serializer_class.Meta.fields.remove("selfUrl")
-    queryset = experience_models.WelcomeLanguage.objects.all()
+    queryset = experience_models.WelcomeLanguage.objects.prefetch_related(
+        *experience_serializers.get_image_prefetches(experience_models.WelcomeLanguage)
+    )
     default_params = {"depth": None, "browsable": "false"}
 
 
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class ImageAuthConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "image_auth"
+
+    def ready(self):
+        from . import signals  # noqa: F401
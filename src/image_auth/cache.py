@@ -0,0 +1,203 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth.models import AbstractBaseUser, AnonymousUser
+from django.core.cache import caches
+
+from cheminova.cache import LRUCache, SharedVersion
+from custom_images.permissions import permissions_version
+
+local_decisions = LRUCache(
+    max_entries=settings.IMAGE_AUTH_CACHE_MAX_ENTRIES,
+    timeout=settings.IMAGE_AUTH_CACHE_TIMEOUT,
+)
+# Other processes forget a path only when their local entry expires, so the local
+# timeout is kept as short as the version timeout.
+local_not_found = LRUCache(
+    max_entries=settings.IMAGE_AUTH_NOT_FOUND_MAX_ENTRIES,
+    timeout=settings.IMAGE_AUTH_CACHE_VERSION_TIMEOUT,
+)
+decisions_version = SharedVersion(
+    "image-auth-decisions",
+    cache_alias=settings.IMAGE_AUTH_CACHE_ALIAS,
+    local_timeout=settings.IMAGE_AUTH_CACHE_VERSION_TIMEOUT,
+)
+
+
+def get_user_key(user: AbstractBaseUser | AnonymousUser) -> str:
+    """
+    All anonymous users share the same decisions, the decisions of other users are
+    keyed by the version of their collection permissions.
+    """
+    if user.is_authenticated:
+        return f"{user.pk}.{permissions_version.get()}"
+    return "anonymous"
+
+
+async def aget_user_key(user: AbstractBaseUser | AnonymousUser) -> str:
+    if user.is_authenticated:
+        return f"{user.pk}.{await permissions_version.aget()}"
+    return "anonymous"
+
+
+def get_cache_key(image_file: str, user_key: str, version: int) -> str:
+    """
+    Get the cache key of a decision for the given media path and user key under the
+    given decisions version.
+    """
+    file_key = hashlib.md5(image_file.encode()).hexdigest()
+    return f"image-auth:{version}:{user_key}:{file_key}"
+
+
+def get_not_found_key(image_file: str) -> str:
+    return f"image-auth:not-found:{hashlib.md5(image_file.encode()).hexdigest()}"
+
+
+class CachedDecisions:
+    """
+    The decisions of a set of media paths found in the local caches, and the shared
+    cache keys of the remaining paths, to be read with a single get_many.
+    """
+
+    def __init__(self, image_files, user_key: str, version: int):
+        self.decisions = {}
+        self.not_found = set()
+        self.keys = {}
+        for image_file in image_files:
+            if local_not_found.get(image_file):
+                self.not_found.add(image_file)
+                continue
+            key = get_cache_key(image_file, user_key, version)
+            decision = local_decisions.get(key)
+            if decision is None:
+                self.keys[key] = image_file
+                self.keys[get_not_found_key(image_file)] = image_file
+            else:
+                self.decisions[image_file] = decision
+
+    def update(self, cached: dict) -> tuple[dict[str, str], set[str]]:
+        """
+        Add the values read from the shared cache, keep them in the local caches and
+        return the decisions and the paths without an image.
+        """
+        for key, value in cached.items():
+            image_file = self.keys[key]
+            if key.startswith("image-auth:not-found:"):
+                local_not_found.set(image_file, True)
+                self.not_found.add(image_file)
+            else:
+                local_decisions.set(key, value)
+                self.decisions[image_file] = value
+        for image_file in self.not_found:
+            self.decisions.pop(image_file, None)
+        return self.decisions, self.not_found
+
+
+def get_cached_decisions(
+    image_files, user: AbstractBaseUser | AnonymousUser
+) -> tuple[dict[str, str], set[str]]:
+    """
+    Get the cached decisions for the given media paths and user, and the paths that
+    were recently found to have no image. Paths missing from both are unknown.
+    All keys are read from the shared cache in a single round trip.
+    """
+    cached_decisions = CachedDecisions(
+        image_files, get_user_key(user), decisions_version.get()
+    )
+    cached = {}
+    if cached_decisions.keys:
+        cached = caches[settings.IMAGE_AUTH_CACHE_ALIAS].get_many(
+            cached_decisions.keys.keys()
+        )
+    return cached_decisions.update(cached)
+
+
+async def aget_cached_decisions(
+    image_files, user: AbstractBaseUser | AnonymousUser
+) -> tuple[dict[str, str], set[str]]:
+    cached_decisions = CachedDecisions(
+        image_files, await aget_user_key(user), await decisions_version.aget()
+    )
+    cached = {}
+    if cached_decisions.keys:
+        cached = await caches[settings.IMAGE_AUTH_CACHE_ALIAS].aget_many(
+            cached_decisions.keys.keys()
+        )
+    return cached_decisions.update(cached)
+
+
+def get_decisions_to_cache(decisions: dict[str, str], user_key: str, version: int):
+    entries = {
+        get_cache_key(image_file, user_key, version): decision
+        for image_file, decision in decisions.items()
+    }
+    for key, decision in entries.items():
+        local_decisions.set(key, decision)
+    return entries
+
+
+def get_not_found_to_cache(image_files) -> dict[str, bool]:
+    for image_file in image_files:
+        local_not_found.set(image_file, True)
+    return {get_not_found_key(image_file): True for image_file in image_files}
+
+
+def set_decisions(
+    decisions: dict[str, str],
+    not_found,
+    user: AbstractBaseUser | AnonymousUser,
+    version: int,
+) -> None:
+    """
+    Cache the decisions for the given media paths and user under the decisions
+    version they were made with, and remember the paths without an image for
+    IMAGE_AUTH_NOT_FOUND_TIMEOUT. Each is a single write to the shared cache.
+    """
+    cache = caches[settings.IMAGE_AUTH_CACHE_ALIAS]
+    if decisions:
+        cache.set_many(
+            get_decisions_to_cache(decisions, get_user_key(user), version),
+            timeout=settings.IMAGE_AUTH_CACHE_TIMEOUT,
+        )
+    if not_found:
+        cache.set_many(
+            get_not_found_to_cache(not_found),
+            timeout=settings.IMAGE_AUTH_NOT_FOUND_TIMEOUT,
+        )
+
+
+async def aset_decisions(
+    decisions: dict[str, str],
+    not_found,
+    user: AbstractBaseUser | AnonymousUser,
+    version: int,
+) -> None:
+    cache = caches[settings.IMAGE_AUTH_CACHE_ALIAS]
+    if decisions:
+        await cache.aset_many(
+            get_decisions_to_cache(decisions, await aget_user_key(user), version),
+            timeout=settings.IMAGE_AUTH_CACHE_TIMEOUT,
+        )
+    if not_found:
+        await cache.aset_many(
+            get_not_found_to_cache(not_found),
+            timeout=settings.IMAGE_AUTH_NOT_FOUND_TIMEOUT,
+        )
+
+
+def forget_not_found(image_file: str) -> None:
+    """
+    Forget that the media path had no image, e.g. when an image or rendition with
+    that file is created.
+    """
+    local_not_found.delete(image_file)
+    caches[settings.IMAGE_AUTH_CACHE_ALIAS].delete(get_not_found_key(image_file))
+
+
+def invalidate_decisions() -> None:
+    """
+    Invalidate all cached decisions in this and, after the version timeout, all
+    other processes.
+    """
+    decisions_version.bump()
+    local_decisions.clear()
@@ -0,0 +1,204 @@
+from django.conf import settings
+from django.contrib.auth.models import AbstractBaseUser, AnonymousUser
+
+from custom_images.permissions import (
+    aget_image_collection_ids,
+    get_image_collection_ids,
+)
+
+from .cache import (
+    aget_cached_decisions,
+    aset_decisions,
+    decisions_version,
+    get_cached_decisions,
+    set_decisions,
+)
+from .index import public_media
+from .lookup import aget_image_lookups, get_image_lookups
+
+# Images everybody may view: referenced by a live page or in an approved collection.
+PUBLIC = "public"
+# Images only the requesting user may view through their collection permissions.
+PRIVATE = "private"
+DENIED = "denied"
+NOT_FOUND = "not_found"
+
+DECISION_STATUS = {
+    PUBLIC: 200,
+    PRIVATE: 200,
+    DENIED: 401,
+    NOT_FOUND: 404,
+}
+
+STATUS_MESSAGES = {
+    200: "OK",
+    400: "Bad Request",
+    401: "Unauthorized",
+    404: "Not found",
+}
+
+
+def decide(image: dict | None, user: AbstractBaseUser | AnonymousUser) -> str:
+    """
+    Decide whether the user may view the image of an image lookup.
+    """
+    if not image:
+        return NOT_FOUND
+
+    if image["is_public"]:
+        return PUBLIC
+
+    if image["collection_id"] in get_image_collection_ids(user):
+        return PRIVATE
+
+    return DENIED
+
+
+async def adecide(image: dict | None, user: AbstractBaseUser | AnonymousUser) -> str:
+    if not image:
+        return NOT_FOUND
+
+    if image["is_public"]:
+        return PUBLIC
+
+    if image["collection_id"] in await aget_image_collection_ids(user):
+        return PRIVATE
+
+    return DENIED
+
+
+def resolve_decisions(
+    requested_images: dict[str, str], user: AbstractBaseUser | AnonymousUser
+) -> dict[str, str]:
+    """
+    Decide whether the user may view each of the requested images, given as a
+    mapping of file path to image type. Anonymous requests for public images are
+    answered from the public media index, others from the decision cache or the
+    cache of media paths without an image, read together. The remaining images are
+    looked up together and their decisions are cached in a single write.
+    """
+    decisions = {}
+    anonymous = not user.is_authenticated
+    for requested_image in requested_images:
+        if anonymous and public_media.contains(requested_image):
+            decisions[requested_image] = PUBLIC
+
+    cached_decisions, not_found = get_cached_decisions(
+        [
+            requested_image
+            for requested_image in requested_images
+            if requested_image not in decisions
+        ],
+        user,
+    )
+    decisions.update(cached_decisions)
+    decisions.update(dict.fromkeys(not_found, NOT_FOUND))
+
+    missing_images = {
+        requested_image: image_type
+        for requested_image, image_type in requested_images.items()
+        if requested_image not in decisions
+    }
+    if missing_images:
+        version = decisions_version.get()
+        images = get_image_lookups(missing_images)
+        new_decisions = {
+            requested_image: decide(images.get(requested_image), user)
+            for requested_image in missing_images
+        }
+        set_decisions(
+            {
+                requested_image: decision
+                for requested_image, decision in new_decisions.items()
+                if decision != NOT_FOUND
+            },
+            [
+                requested_image
+                for requested_image, decision in new_decisions.items()
+                if decision == NOT_FOUND
+            ],
+            user,
+            version,
+        )
+        for requested_image, decision in new_decisions.items():
+            if decision == PUBLIC:
+                public_media.add(requested_image, version)
+        decisions.update(new_decisions)
+
+    return decisions
+
+
+async def aresolve_decisions(
+    requested_images: dict[str, str], user: AbstractBaseUser | AnonymousUser
+) -> dict[str, str]:
+    """
+    Async version of resolve_decisions.
+    """
+    decisions = {}
+    anonymous = not user.is_authenticated
+    for requested_image in requested_images:
+        if anonymous and await public_media.acontains(requested_image):
+            decisions[requested_image] = PUBLIC
+
+    cached_decisions, not_found = await aget_cached_decisions(
+        [
+            requested_image
+            for requested_image in requested_images
+            if requested_image not in decisions
+        ],
+        user,
+    )
+    decisions.update(cached_decisions)
+    decisions.update(dict.fromkeys(not_found, NOT_FOUND))
+
+    missing_images = {
+        requested_image: image_type
+        for requested_image, image_type in requested_images.items()
+        if requested_image not in decisions
+    }
+    if missing_images:
+        version = await decisions_version.aget()
+        images = await aget_image_lookups(missing_images)
+        new_decisions = {
+            requested_image: await adecide(images.get(requested_image), user)
+            for requested_image in missing_images
+        }
+        await aset_decisions(
+            {
+                requested_image: decision
+                for requested_image, decision in new_decisions.items()
+                if decision != NOT_FOUND
+            },
+            [
+                requested_image
+                for requested_image, decision in new_decisions.items()
+                if decision == NOT_FOUND
+            ],
+            user,
+            version,
+        )
+        for requested_image, decision in new_decisions.items():
+            if decision == PUBLIC:
+                public_media.add(requested_image, version)
+        decisions.update(new_decisions)
+
+    return decisions
+
+
+def get_cache_headers(decision: str) -> dict:
+    """
+    Get the headers that let an nginx proxy_cache on the image-auth location reuse
+    public decisions for all visitors. All other decisions depend on the user and
+    must never be shared. Media URLs stay the same when an image is unpublished or
+    moderated, so public decisions are only cached for IMAGE_AUTH_PUBLIC_MAX_AGE.
+    """
+    headers = {"X-Image-Auth-Decision": decision}
+    if decision == PUBLIC:
+        max_age = settings.IMAGE_AUTH_PUBLIC_MAX_AGE
+        headers["Cache-Control"] = f"public, max-age={max_age}"
+        headers["X-Accel-Expires"] = str(max_age)
+    else:
+        headers["Cache-Control"] = "private, no-store"
+        headers["X-Accel-Expires"] = "0"
+        headers["Vary"] = "Cookie"
+    return headers
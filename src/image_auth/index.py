@@ -0,0 +1,88 @@
+import threading
+
+from asgiref.sync import sync_to_async
+from wagtail.images import get_image_model
+
+from .cache import decisions_version
+
+
+def get_public_media_paths(image_ids=None) -> tuple[set[int], set[str]]:
+    """
+    Get the ids and the original and rendition file paths of all public images, i.e.
+    images referenced by a live page or in an approved collection, or of the public
+    images among the given ones.
+    """
+    Image = get_image_model()
+    RenditionModel = Image.get_rendition_model()
+
+    images = Image.objects.filter(is_public=True)
+    if image_ids is not None:
+        images = images.filter(pk__in=image_ids)
+    images = dict(images.values_list("pk", "file"))
+    renditions = RenditionModel.objects.filter(image_id__in=images.keys()).values_list(
+        "file", flat=True
+    )
+    return set(images.keys()), {*images.values(), *renditions}
+
+
+class PublicMediaIndex:
+    """
+    An in-process index of the media paths of all public images and their
+    renditions, so that anonymous requests for them can be allowed without querying
+    the database. The index is rebuilt on first use after the image-auth decisions
+    version changed. Paths missing from the index are not necessarily private, they
+    have to be checked against the database.
+    """
+
+    def __init__(self):
+        self._image_ids = set()
+        self._paths = set()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def contains(self, path: str) -> bool:
+        version = decisions_version.get()
+        if self._version != version:
+            # Requests arriving while another thread rebuilds the index fall
+            # through to the database.
+            if not self._lock.acquire(blocking=False):
+                return False
+            try:
+                self._image_ids, self._paths = get_public_media_paths()
+                self._version = version
+            finally:
+                self._lock.release()
+        return path in self._paths
+
+    async def acontains(self, path: str) -> bool:
+        """
+        Async version of contains. Only rebuilding the index runs in a thread.
+        """
+        if self._version != await decisions_version.aget():
+            return await sync_to_async(self.contains)(path)
+        return path in self._paths
+
+    def add(self, path: str, version: int) -> None:
+        """
+        Add a path found to be public while the given decisions version was current.
+        """
+        if self._version == version:
+            self._paths.add(path)
+
+    def add_images(self, image_ids: list[int]) -> None:
+        """
+        Add the public images among the given ones, e.g. new images in an approved
+        collection, without rebuilding the index.
+        """
+        if self._version is None:
+            return
+        image_ids, paths = get_public_media_paths(image_ids)
+        self._image_ids |= image_ids
+        self._paths |= paths
+
+    def add_rendition(self, image_id: int, path: str) -> None:
+        if image_id in self._image_ids:
+            self._paths.add(path)
+
+
+public_media = PublicMediaIndex()
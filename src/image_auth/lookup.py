@@ -0,0 +1,66 @@
+from django.db.models import F
+from wagtail.images import get_image_model
+
+LOOKUP_FIELDS = ("id", "collection_id", "is_public")
+
+
+def get_files_by_type(requested_images: dict[str, str]) -> dict[str, list[str]]:
+    files_by_type = {"original": [], "rendition": []}
+    for requested_image, image_type in requested_images.items():
+        files_by_type[image_type].append(requested_image)
+    return files_by_type
+
+
+def get_image_lookups(requested_images: dict[str, str]) -> dict[str, dict]:
+    """
+    Get the id, collection id and public flag of the images of many original or
+    rendition files, given as a mapping of file path to image type. Uses one query
+    per image type. Files without an image are missing from the result.
+    """
+    images = get_image_model().objects.all()
+    files_by_type = get_files_by_type(requested_images)
+
+    lookups = {}
+    if files_by_type["original"]:
+        lookups.update(
+            (image.pop("requested_file"), image)
+            for image in images.filter(file__in=files_by_type["original"]).values(
+                *LOOKUP_FIELDS, requested_file=F("file")
+            )
+        )
+    if files_by_type["rendition"]:
+        lookups.update(
+            (image.pop("requested_file"), image)
+            for image in images.filter(
+                renditions__file__in=files_by_type["rendition"]
+            ).values(*LOOKUP_FIELDS, requested_file=F("renditions__file"))
+        )
+    return lookups
+
+
+async def aget_image_lookups(requested_images: dict[str, str]) -> dict[str, dict]:
+    """
+    Async version of get_image_lookups.
+    """
+    images = get_image_model().objects.all()
+    files_by_type = get_files_by_type(requested_images)
+
+    lookups = {}
+    if files_by_type["original"]:
+        async for image in images.filter(file__in=files_by_type["original"]).values(
+            *LOOKUP_FIELDS, requested_file=F("file")
+        ):
+            lookups[image.pop("requested_file")] = image
+    if files_by_type["rendition"]:
+        async for image in images.filter(
+            renditions__file__in=files_by_type["rendition"]
+        ).values(*LOOKUP_FIELDS, requested_file=F("renditions__file")):
+            lookups[image.pop("requested_file")] = image
+    return lookups
+
+
+def get_image_lookup(requested_image: str, image_type: str) -> dict | None:
+    """
+    Get the lookup of a single original or rendition file, in a single query.
+    """
+    return get_image_lookups({requested_image: image_type}).get(requested_image)
@@ -0,0 +1,90 @@
+import logging
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .seed import BenchmarkData
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    latencies: list[float] = field(default_factory=list)
+    queries: int = 0
+    duration: float = 0.0
+    statuses: Counter = field(default_factory=Counter)
+
+
+def get_scenarios(data: BenchmarkData) -> dict[str, tuple[bool, list[str]]]:
+    """
+    Get the access patterns to replay, as a mapping of scenario name to whether the
+    requests are made by the editor and the media paths to request.
+    """
+    return {
+        "anonymous-public": (False, data.public_paths),
+        "anonymous-private": (False, data.private_paths),
+        "editor": (
+            True,
+            data.public_paths + data.editable_paths + data.private_paths,
+        ),
+        "nonexistent": (False, data.nonexistent_paths),
+    }
+
+
+def choose_paths(
+    paths: list[str], n_requests: int, skew: float, rng: random.Random
+) -> list[str]:
+    """
+    Choose the paths to request. Gallery traffic concentrates on few images, so the
+    paths are drawn with Zipf-like weights: the path of rank k has the weight 1/k^skew.
+    """
+    if not paths:
+        return []
+    paths = rng.sample(paths, len(paths))
+    weights = [1 / (rank**skew) for rank in range(1, len(paths) + 1)]
+    return rng.choices(paths, weights=weights, k=n_requests)
+
+
+def replay(
+    name: str,
+    paths: list[str],
+    editor=None,
+    url: str | None = None,
+) -> ScenarioResult:
+    """
+    Request each path from the image-auth view like the nginx auth subrequest does,
+    through the full middleware stack, and measure latency and SQL queries.
+    """
+    client = Client()
+    if editor is not None:
+        client.force_login(editor)
+    url = url or reverse("image-permissions").replace(settings.BASE_PATH, "/")
+
+    # Django logs a warning for every 401 and 404 response.
+    request_logger = logging.getLogger("django.request")
+    log_level = request_logger.level
+    request_logger.setLevel(logging.ERROR)
+
+    result = ScenarioResult(name=name)
+    start = time.perf_counter()
+    try:
+        for path in paths:
+            with CaptureQueriesContext(connection) as queries:
+                request_start = time.perf_counter()
+                response = client.get(
+                    url, headers={"X-Original-Uri": f"{settings.MEDIA_URL}{path}"}
+                )
+                result.latencies.append(time.perf_counter() - request_start)
+            result.queries += len(queries)
+            result.statuses[response.status_code] += 1
+    finally:
+        request_logger.setLevel(log_level)
+    result.duration = time.perf_counter() - start
+    return result
@@ -0,0 +1,49 @@
+import statistics
+
+from .replay import ScenarioResult
+
+
+def get_percentiles(latencies: list[float]) -> dict[str, float]:
+    """
+    Get the p50, p95 and p99 latencies in milliseconds.
+    """
+    if len(latencies) < 2:
+        latency = latencies[0] * 1000 if latencies else 0.0
+        return {"p50": latency, "p95": latency, "p99": latency}
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "p50": quantiles[49] * 1000,
+        "p95": quantiles[94] * 1000,
+        "p99": quantiles[98] * 1000,
+    }
+
+
+def summarize(result: ScenarioResult) -> dict:
+    n_requests = len(result.latencies)
+    return {
+        "scenario": result.name,
+        "requests": n_requests,
+        **get_percentiles(result.latencies),
+        "throughput": n_requests / result.duration if result.duration else 0.0,
+        "queries_per_decision": result.queries / n_requests if n_requests else 0.0,
+        "statuses": dict(sorted(result.statuses.items())),
+    }
+
+
+def format_table(summaries: list[dict]) -> str:
+    header = (
+        f"{'scenario':<24} {'requests':>8} {'p50 ms':>8} {'p95 ms':>8} "
+        f"{'p99 ms':>8} {'req/s':>9} {'queries':>8}  statuses"
+    )
+    lines = [header, "-" * len(header)]
+    for summary in summaries:
+        statuses = ", ".join(
+            f"{status}: {count}" for status, count in summary["statuses"].items()
+        )
+        lines.append(
+            f"{summary['scenario']:<24} {summary['requests']:>8} "
+            f"{summary['p50']:>8.2f} {summary['p95']:>8.2f} {summary['p99']:>8.2f} "
+            f"{summary['throughput']:>9.1f} {summary['queries_per_decision']:>8.2f}"
+            f"  {statuses}"
+        )
+    return "\n".join(lines)
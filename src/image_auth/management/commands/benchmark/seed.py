@@ -0,0 +1,180 @@
+import random
+from dataclasses import dataclass, field
+from logging import getLogger
+
+from django.contrib.auth.models import Group, Permission, User
+from django.contrib.contenttypes.models import ContentType
+from wagtail.images import get_image_model
+from wagtail.images.models import Image
+from wagtail.models import Collection, GroupCollectionPermission, Page, ReferenceIndex
+
+from experience.models import Character, Characters, WelcomeIntro
+
+logger = getLogger(__name__)
+
+RENDITION_FILTER_SPECS = ["width-400", "width-800", "fill-200x200", "max-1600x1600"]
+# Images referenced by each benchmark page: background and three layers.
+IMAGES_PER_PAGE = 4
+
+
+@dataclass
+class BenchmarkData:
+    """
+    Media paths of the seeded images, grouped by who may view them.
+    """
+
+    public_paths: list[str] = field(default_factory=list)
+    private_paths: list[str] = field(default_factory=list)
+    editable_paths: list[str] = field(default_factory=list)
+    nonexistent_paths: list[str] = field(default_factory=list)
+    editor: User | None = None
+
+
+def seed(
+    n_characters: int,
+    n_images: int,
+    n_renditions: int,
+    n_live_pages: int,
+    rng: random.Random,
+) -> BenchmarkData:
+    """
+    Seed characters with approved and not approved collections, images with
+    renditions in these collections, a tree of live pages referencing images, and an
+    editor who may view the not approved images of half of the characters. Image
+    files are not written, image-auth only looks at their paths.
+    """
+    ImageModel = get_image_model()
+    RenditionModel = ImageModel.get_rendition_model()
+    data = BenchmarkData()
+
+    root_collection = Collection.get_first_root_node()
+    pages_collection = root_collection.add_child(name="Benchmark Pages")
+    root_page = Page.objects.get(depth=1)
+    characters_page = root_page.add_child(
+        instance=Characters(title="Benchmark Characters", slug="benchmark-characters")
+    )
+    characters = [
+        Character(
+            page=characters_page,
+            name=f"Benchmark Character {i}",
+            slug=f"benchmark-{i}",
+            approved_collection=root_collection.add_child(
+                name=f"Benchmark Approved {i}"
+            ),
+            not_approved_collection=root_collection.add_child(
+                name=f"Benchmark Not Approved {i}"
+            ),
+        )
+        for i in range(n_characters)
+    ]
+    for character in characters:
+        character.save()
+
+    # Reserve the first images for the live pages, spread the others over the
+    # approved and not approved collections of the characters.
+    n_page_images = min(n_live_pages * IMAGES_PER_PAGE, n_images)
+    images = []
+    for i in range(n_images):
+        if i < n_page_images:
+            collection = pages_collection
+        else:
+            character = rng.choice(characters)
+            collection = rng.choice(
+                [character.approved_collection, character.not_approved_collection]
+            )
+        images.append(
+            ImageModel(
+                title=f"Benchmark Image {i}",
+                file=f"original_images/benchmark-{i}.png",
+                width=1600,
+                height=1200,
+                collection=collection,
+            )
+        )
+    images = ImageModel.objects.bulk_create(images, batch_size=1000)
+
+    renditions = [
+        RenditionModel(
+            image=image,
+            filter_spec=filter_spec,
+            file=f"images/benchmark-{i}.{filter_spec}.png",
+            width=400,
+            height=300,
+        )
+        for i, image in enumerate(images)
+        for filter_spec in RENDITION_FILTER_SPECS[:n_renditions]
+    ]
+    RenditionModel.objects.bulk_create(renditions, batch_size=1000)
+
+    for i in range(n_live_pages):
+        page_images = images[i * IMAGES_PER_PAGE : (i + 1) * IMAGES_PER_PAGE]
+        if not page_images:
+            break
+        page = root_page.add_child(
+            instance=WelcomeIntro(
+                title=f"Benchmark Page {i}",
+                slug=f"benchmark-page-{i}",
+                live=True,
+                **dict(
+                    zip(
+                        [
+                            "background_image",
+                            "background_image_layer_1",
+                            "background_image_layer_2",
+                            "background_image_layer_3",
+                        ],
+                        page_images,
+                    )
+                ),
+            )
+        )
+        ReferenceIndex.create_or_update_for_object(page)
+
+    # Images created with bulk_create and references created directly skip the
+    # signal handlers that maintain the live flags.
+    ImageModel.objects.filter(
+        collection_id__in={image.collection_id for image in images}
+    ).refresh_live_flags()
+
+    editable_collection_ids = {
+        character.not_approved_collection_id for character in characters[::2]
+    }
+    approved_collection_ids = {
+        character.approved_collection_id for character in characters
+    }
+    paths_by_image = {}
+    for rendition in renditions:
+        paths_by_image.setdefault(rendition.image_id, []).append(str(rendition.file))
+    for i, image in enumerate(images):
+        paths = [str(image.file), *paths_by_image.get(image.id, [])]
+        if i < n_page_images or image.collection_id in approved_collection_ids:
+            data.public_paths.extend(paths)
+        elif image.collection_id in editable_collection_ids:
+            data.editable_paths.extend(paths)
+        else:
+            data.private_paths.extend(paths)
+    data.nonexistent_paths = [
+        f"original_images/benchmark-missing-{i}.png" for i in range(n_images)
+    ]
+
+    group = Group.objects.create(name="Benchmark Editors")
+    change_image_permission = Permission.objects.get(
+        content_type=ContentType.objects.get_for_model(Image),
+        codename="change_image",
+    )
+    GroupCollectionPermission.objects.bulk_create(
+        GroupCollectionPermission(
+            group=group,
+            collection_id=collection_id,
+            permission=change_image_permission,
+        )
+        for collection_id in editable_collection_ids
+    )
+    data.editor = User.objects.create_user(username="benchmark-editor")
+    data.editor.groups.add(group)
+
+    logger.info(
+        f"Seeded {n_characters} characters, {len(images)} images, "
+        f"{len(renditions)} renditions and {n_live_pages} live pages."
+    )
+    return data
@@ -0,0 +1,138 @@
+import json
+import logging
+import random
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import transaction
+from django.urls import reverse
+
+from custom_images.permissions import permissions_version
+from image_auth.cache import invalidate_decisions
+
+from .benchmark.replay import choose_paths, get_scenarios, replay
+from .benchmark.report import format_table, summarize
+from .benchmark.seed import RENDITION_FILTER_SPECS, seed
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the image-auth view: seed characters, images, renditions and live "
+        "pages, replay gallery access patterns and report latency percentiles, "
+        "throughput and SQL queries per decision. The seeded data is rolled back."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "-c",
+            "--characters",
+            type=int,
+            default=10,
+            help="Number of characters to seed. (default: 10)",
+        )
+        parser.add_argument(
+            "-i",
+            "--images",
+            type=int,
+            default=5000,
+            help="Number of images to seed. (default: 5000)",
+        )
+        parser.add_argument(
+            "-r",
+            "--renditions",
+            type=int,
+            default=2,
+            choices=range(len(RENDITION_FILTER_SPECS) + 1),
+            help="Number of renditions per image. (default: 2)",
+        )
+        parser.add_argument(
+            "-p",
+            "--live-pages",
+            type=int,
+            default=100,
+            help="Number of live pages, each referencing four images. (default: 100)",
+        )
+        parser.add_argument(
+            "-n",
+            "--requests",
+            type=int,
+            default=2000,
+            help="Number of requests per scenario. (default: 2000)",
+        )
+        parser.add_argument(
+            "-s",
+            "--scenario",
+            action="append",
+            choices=["anonymous-public", "anonymous-private", "editor", "nonexistent"],
+            help="Scenario to replay, can be repeated. (default: all)",
+        )
+        parser.add_argument(
+            "--skew",
+            type=float,
+            default=1.1,
+            help="Zipf exponent of the image popularity, 0 requests images uniformly. (default: 1.1)",
+        )
+        parser.add_argument(
+            "--view",
+            choices=["sync", "async"],
+            default="sync",
+            help="Image-auth view to benchmark. (default: sync)",
+        )
+        parser.add_argument(
+            "--random-seed",
+            type=int,
+            default=0,
+            help="Seed of the random access patterns. (default: 0)",
+        )
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            help="Print the results as JSON, e.g. to compare runs.",
+        )
+
+    def handle(self, *args, **options) -> None:
+        rng = random.Random(options["random_seed"])
+        url_name = {
+            "sync": "image-permissions",
+            "async": "image-permissions-async",
+        }[options["view"]]
+        url = reverse(url_name).replace(settings.BASE_PATH, "/")
+
+        try:
+            with transaction.atomic():
+                data = seed(
+                    n_characters=options["characters"],
+                    n_images=options["images"],
+                    n_renditions=options["renditions"],
+                    n_live_pages=options["live_pages"],
+                    rng=rng,
+                )
+                summaries = []
+                for name, (as_editor, paths) in get_scenarios(data).items():
+                    if options["scenario"] and name not in options["scenario"]:
+                        continue
+                    # Every scenario starts with empty decision caches.
+                    invalidate_decisions()
+                    result = replay(
+                        name,
+                        choose_paths(paths, options["requests"], options["skew"], rng),
+                        editor=data.editor if as_editor else None,
+                        url=url,
+                    )
+                    summaries.append(summarize(result))
+                transaction.set_rollback(True)
+        except Exception as e:
+            raise CommandError(f"Error benchmarking image-auth: {e}")
+        finally:
+            # Drop decisions and permissions cached for the rolled back data.
+            invalidate_decisions()
+            permissions_version.bump()
+
+        if options["json"]:
+            self.stdout.write(json.dumps(summaries, indent=2))
+        else:
+            self.stdout.write(format_table(summaries))
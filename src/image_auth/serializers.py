@@ -0,0 +1,10 @@
+from django.conf import settings
+from rest_framework import serializers
+
+
+class BatchPermissionsRequestSerializer(serializers.Serializer):
+    uris = serializers.ListField(
+        child=serializers.CharField(),
+        allow_empty=False,
+        max_length=settings.IMAGE_AUTH_BATCH_MAX_URIS,
+    )
@@ -0,0 +1,66 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from wagtail.images import get_image_model
+from wagtail.models import Page
+from wagtail.signals import page_published, page_unpublished
+
+from custom_images.signals import images_moved, live_flags_changed
+from experience.models import Character
+
+from .cache import forget_not_found, invalidate_decisions
+from .index import public_media
+
+
+@receiver(post_save, sender=Character)
+@receiver(post_delete, sender=Character)
+@receiver(post_delete, sender=get_image_model())
+@receiver(post_delete, sender=Page)
+@receiver(page_published)
+@receiver(page_unpublished)
+@receiver(images_moved)
+def invalidate_image_auth_decisions(**kwargs) -> None:
+    """
+    Any of these changes can make an image public or private.
+    """
+    invalidate_decisions()
+
+
+@receiver(post_save, sender=get_image_model())
+def invalidate_image_auth_decisions_on_image_save(
+    instance, created: bool, **kwargs
+) -> None:
+    """
+    Moving an image to another collection (moderation) changes who may view it.
+    New images have no cached decisions, other changes do not affect them.
+    """
+    if not created and instance.collection_changed():
+        invalidate_decisions()
+
+
+@receiver(live_flags_changed)
+def update_image_auth_on_live_flags_change(
+    image_ids: list[int], created: bool = False, **kwargs
+) -> None:
+    """
+    New public images are added to the public media index, other flag changes can
+    make public images private.
+    """
+    if created:
+        public_media.add_images(image_ids)
+    else:
+        invalidate_decisions()
+
+
+@receiver(post_save, sender=get_image_model().get_rendition_model())
+def add_rendition_to_public_media(instance, created: bool, **kwargs) -> None:
+    if created:
+        public_media.add_rendition(instance.image_id, instance.file.name)
+
+
+@receiver(post_save, sender=get_image_model())
+@receiver(post_save, sender=get_image_model().get_rendition_model())
+def forget_image_auth_not_found(instance, **kwargs) -> None:
+    """
+    Uploads and new renditions may create files that were requested before.
+    """
+    forget_not_found(instance.file.name)
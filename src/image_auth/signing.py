@@ -0,0 +1,42 @@
+import base64
+import hashlib
+import time
+from urllib.parse import unquote, urlencode, urlsplit
+
+from django.conf import settings
+
+
+def get_expires(now: float | None = None) -> int:
+    """
+    Get the expiry timestamp for URLs signed now. Expiries are rounded up to the next
+    multiple of MEDIA_URL_SIGNING_EXPIRES, so URLs stay the same, and cacheable by
+    clients, for that long and are valid for at least that long.
+    """
+    step = settings.MEDIA_URL_SIGNING_EXPIRES
+    now = time.time() if now is None else now
+    return (int(now) // step + 2) * step
+
+
+def get_signature(path: str, expires: int) -> str:
+    """
+    Get the signature of a URL path in the format verified by the nginx secure_link
+    module with `secure_link_md5 "$secure_link_expires$uri $media_signing_secret"`.
+    """
+    digest = hashlib.md5(
+        f"{expires}{path} {settings.MEDIA_URL_SIGNING_SECRET}".encode()
+    ).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+
+def sign_media_url(url: str) -> str:
+    """
+    Add an expiry and a signature to a media URL, if MEDIA_URL_SIGNING_SECRET is set.
+    nginx serves media with a valid signature without the image-auth subrequest.
+    """
+    if not settings.MEDIA_URL_SIGNING_SECRET:
+        return url
+
+    expires = get_expires()
+    signature = get_signature(unquote(urlsplit(url).path), expires)
+    separator = "&" if "?" in url else "?"
+    return f"{url}{separator}{urlencode({'md5': signature, 'expires': expires})}"
@@ -1,20 +1,40 @@
-from io import BytesIO
+import base64
+import hashlib
+import json
+from io import BytesIO, StringIO
 from pathlib import Path
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
 
 import PIL.Image
 from django.conf import settings
 from django.contrib.auth.models import Group, Permission, User
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
 from django.core.files.images import ImageFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from wagtail.images import get_image_model
 from wagtail.images.models import Image
-from wagtail.models import Collection, GroupCollectionPermission, Page, ReferenceIndex
+from wagtail.models import Collection, GroupCollectionPermission, Page
 
+from cheminova.cache import SharedVersion
+from custom_images.permissions import get_image_collection_ids
 from experience.models import Character, Characters, Welcome
 
+from .cache import decisions_version
+from .lookup import get_image_lookup
+from .signing import get_expires, sign_media_url
+
+# The shared cache is Redis in production. Tests of query counts use a local cache,
+# so that they count the database queries only, not the fallback cache table.
+LOCAL_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
 
 def get_test_image_file(filename="test.png", colour="white", size=(640, 480)):
     f = BytesIO()
@@ -123,9 +143,10 @@ class ImageAuthTests(APITestCase):
             title="Welcome", slug="welcome", background_image=self.published_image
         )
         root_page.add_child(instance=self.welcome)
-        revision = self.welcome.save_revision()
-        self.welcome.publish(revision)
-        ReferenceIndex.create_or_update_for_object(self.welcome)
+        # The reference index and the live flags of images are updated on commit.
+        with self.captureOnCommitCallbacks(execute=True):
+            revision = self.welcome.save_revision()
+            self.welcome.publish(revision)
 
         # Users
         self.editor_username = "editor"
@@ -208,6 +229,87 @@ class ImageAuthTests(APITestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
+    def test_check_permissions_nonexistent_file_cached_until_upload(self):
+        headers = {"X-Original-Uri": f"{settings.MEDIA_URL}original_images/upload.png"}
+        response = self.client.get(self.image_auth_url, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.image_auth_url, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        image = get_image_model().objects.create(
+            title="Test Image Upload",
+            file=get_test_image_file(filename="upload.png"),
+            collection=self.approved_image_collection,
+        )
+        self.images.append(image)
+        self.assertEqual(str(image.file), "original_images/upload.png")
+        response = self.client.get(self.image_auth_url, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_check_permissions_new_images_keep_cached_decisions(self):
+        headers = {
+            "X-Original-Uri": f"{settings.MEDIA_URL}{str(self.approved_image.file)}"
+        }
+        response = self.client.get(self.image_auth_url, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        version = decisions_version.get()
+
+        for collection in [
+            self.not_approved_image_collection,
+            self.approved_image_collection,
+        ]:
+            image = get_image_model().objects.create(
+                title="Test Image New",
+                file=get_test_image_file(filename="new.png"),
+                collection=collection,
+            )
+            self.images.append(image)
+        self.assertEqual(decisions_version.get(), version)
+
+        # The new public image was added to the public media index.
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                self.image_auth_url,
+                headers={"X-Original-Uri": f"{settings.MEDIA_URL}{str(image.file)}"},
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(CACHES=LOCAL_CACHES)
+    def test_check_permissions_unknown_path_round_trips(self):
+        # Build the public media index first.
+        self.client.get(
+            self.image_auth_url,
+            headers={
+                "X-Original-Uri": f"{settings.MEDIA_URL}{self.approved_image.file}"
+            },
+        )
+        headers = {"X-Original-Uri": f"{settings.MEDIA_URL}original_images/crawl.png"}
+        cache = caches[settings.IMAGE_AUTH_CACHE_ALIAS]
+        # The lookup and one read of the decision and not-found keys.
+        with (
+            mock.patch.object(cache, "get_many", wraps=cache.get_many) as get_many,
+            self.assertNumQueries(1),
+        ):
+            response = self.client.get(self.image_auth_url, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        get_many.assert_called_once()
+
+    def test_check_permissions_rejects_malformed_paths(self):
+        for path in [
+            "original_images/test.txt",
+            "original_images/nested/test.png",
+            "original_images/../test.png",
+            "images/",
+            f"images/{'a' * 300}.png",
+        ]:
+            with self.subTest(path=path), self.assertNumQueries(0):
+                response = self.client.get(
+                    self.image_auth_url,
+                    headers={"X-Original-Uri": f"{settings.MEDIA_URL}{path}"},
+                )
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_check_permissions_anonymous_with_published_file(self):
         for file in [self.published_image, self.published_image_rendition]:
             response = self.client.get(
@@ -239,3 +341,320 @@ class ImageAuthTests(APITestCase):
                 headers={"X-Original-Uri": f"{settings.MEDIA_URL}{str(file.file)}"},
             )
             self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_check_permissions_cached_decision(self):
+        headers = {
+            "X-Original-Uri": f"{settings.MEDIA_URL}{str(self.approved_image.file)}"
+        }
+        response = self.client.get(self.image_auth_url, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.image_auth_url, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_check_permissions_cached_decision_invalidated_on_collection_move(self):
+        headers = {
+            "X-Original-Uri": f"{settings.MEDIA_URL}{str(self.approved_image.file)}"
+        }
+        response = self.client.get(self.image_auth_url, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.approved_image.collection = self.not_approved_image_collection
+        self.approved_image.save()
+        response = self.client.get(self.image_auth_url, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_check_permissions_cached_decision_invalidated_on_bulk_move(self):
+        headers = {
+            "X-Original-Uri": f"{settings.MEDIA_URL}{str(self.approved_image.file)}"
+        }
+        response = self.client.get(self.image_auth_url, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        CustomImage = get_image_model()
+        bulk_action_url = reverse(
+            "wagtail_bulk_action",
+            args=(
+                CustomImage._meta.app_label,
+                CustomImage._meta.model_name,
+                "add_to_collection",
+            ),
+        )
+        admin = User.objects.create_superuser(username="admin", password="password")
+        self.client.force_login(admin)
+        response = self.client.post(
+            f"{bulk_action_url}?id={self.approved_image.pk}",
+            {"collection": self.not_approved_image_collection.pk},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.client.logout()
+
+        self.assertFalse(CustomImage.objects.get(pk=self.approved_image.pk).is_public)
+        response = self.client.get(self.image_auth_url, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_check_permissions_anonymous_new_rendition_of_public_image(self):
+        response = self.client.get(
+            self.image_auth_url,
+            headers={
+                "X-Original-Uri": f"{settings.MEDIA_URL}{str(self.approved_image.file)}"
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rendition = self.approved_image.get_rendition("width-100")
+        self.images.append(rendition)
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                self.image_auth_url,
+                headers={
+                    "X-Original-Uri": f"{settings.MEDIA_URL}{str(rendition.file)}"
+                },
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_check_permissions_anonymous_converted_rendition(self):
+        rendition = self.approved_image.get_rendition("width-100|format-avif")
+        self.images.append(rendition)
+        response = self.client.get(
+            self.image_auth_url,
+            headers={"X-Original-Uri": f"{settings.MEDIA_URL}{str(rendition.file)}"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_get_image_lookup_single_query(self):
+        get_image_lookup(str(self.published_image.file), "original")
+        with self.assertNumQueries(1):
+            image = get_image_lookup(
+                str(self.published_image_rendition.file), "rendition"
+            )
+        self.assertEqual(
+            image,
+            {
+                "id": self.published_image.id,
+                "collection_id": self.public_image_collection.id,
+                "is_public": True,
+            },
+        )
+
+    async def test_check_permissions_async(self):
+        async_url = reverse("image-permissions-async").replace(settings.BASE_PATH, "/")
+        expected = {
+            self.published_image_rendition: status.HTTP_200_OK,
+            self.approved_image: status.HTTP_200_OK,
+            self.unpublished_image: status.HTTP_401_UNAUTHORIZED,
+            self.not_approved_image_rendition: status.HTTP_401_UNAUTHORIZED,
+        }
+        for file, expected_status in expected.items():
+            response = await self.async_client.get(
+                async_url,
+                headers={"X-Original-Uri": f"{settings.MEDIA_URL}{file.file}"},
+            )
+            self.assertEqual(response.status_code, expected_status)
+
+        response = await self.async_client.get(async_url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_check_permissions_async_editor(self):
+        async_url = reverse("image-permissions-async").replace(settings.BASE_PATH, "/")
+        await self.async_client.alogin(
+            username=self.editor_username, password=self.editor_password
+        )
+        expected = {
+            self.unpublished_image: status.HTTP_200_OK,
+            self.not_approved_image: status.HTTP_401_UNAUTHORIZED,
+        }
+        for file, expected_status in expected.items():
+            response = await self.async_client.get(
+                async_url,
+                headers={"X-Original-Uri": f"{settings.MEDIA_URL}{file.file}"},
+            )
+            self.assertEqual(response.status_code, expected_status)
+
+    @override_settings(CACHES=LOCAL_CACHES)
+    def test_check_permissions_batch(self):
+        batch_url = reverse("image-permissions-batch").replace(settings.BASE_PATH, "/")
+        uris = {
+            f"{settings.MEDIA_URL}{self.published_image_rendition.file}": "public",
+            f"{settings.MEDIA_URL}{self.approved_image.file}": "public",
+            f"{settings.MEDIA_URL}{self.not_approved_image.file}": "denied",
+            f"{settings.MEDIA_URL}{self.unpublished_image_rendition.file}": "denied",
+            f"{settings.MEDIA_URL}original_images/nonexistent.png": "denied",
+            f"{settings.MEDIA_URL}invalid/test.png": None,
+        }
+        response = self.client.post(batch_url, {"uris": list(uris)}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            {
+                uri: result["decision"]
+                for uri, result in response.data["results"].items()
+            },
+            uris,
+        )
+        self.assertEqual(
+            response.data["results"][f"{settings.MEDIA_URL}invalid/test.png"]["status"],
+            status.HTTP_400_BAD_REQUEST,
+        )
+
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                self.image_auth_url,
+                headers={
+                    "X-Original-Uri": f"{settings.MEDIA_URL}{self.not_approved_image.file}"
+                },
+            )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(CACHES=LOCAL_CACHES)
+    def test_check_permissions_batch_round_trips(self):
+        batch_url = reverse("image-permissions-batch").replace(settings.BASE_PATH, "/")
+        # Build the public media index first.
+        self.client.post(
+            batch_url,
+            {"uris": [f"{settings.MEDIA_URL}{self.approved_image.file}"]},
+            format="json",
+        )
+        cache = caches[settings.IMAGE_AUTH_CACHE_ALIAS]
+        for size, image in [
+            (5, self.not_approved_image),
+            (50, self.not_approved_image_rendition),
+        ]:
+            uris = [f"{settings.MEDIA_URL}{image.file}"]
+            for i in range(size):
+                uris.append(f"{settings.MEDIA_URL}original_images/crawl-{size}-{i}.png")
+                uris.append(f"{settings.MEDIA_URL}images/crawl-{size}-{i}.png")
+            # One lookup per image type, one read and a write each for the
+            # decisions and the paths without an image.
+            with (
+                self.subTest(size=size),
+                mock.patch.object(cache, "get_many", wraps=cache.get_many) as get_many,
+                mock.patch.object(cache, "set_many", wraps=cache.set_many) as set_many,
+                self.assertNumQueries(2),
+            ):
+                response = self.client.post(batch_url, {"uris": uris}, format="json")
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                get_many.assert_called_once()
+                self.assertEqual(set_many.call_count, 2)
+            self.assertEqual(response.data["results"][uris[0]]["decision"], "denied")
+
+    def test_check_permissions_batch_invalid_request(self):
+        batch_url = reverse("image-permissions-batch").replace(settings.BASE_PATH, "/")
+        response = self.client.post(batch_url, {"uris": []}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(MEDIA_URL_SIGNING_SECRET="secret", MEDIA_URL_SIGNING_EXPIRES=60)
+    def test_sign_media_url(self):
+        url = f"http://localhost:8080/cms/media/{self.approved_image.file}"
+        signed_url = urlsplit(sign_media_url(url))
+        query = parse_qs(signed_url.query)
+        expires = query["expires"][0]
+        digest = hashlib.md5(
+            f"{expires}/cms/media/{self.approved_image.file} secret".encode()
+        ).digest()
+        self.assertEqual(
+            query["md5"][0], base64.urlsafe_b64encode(digest).decode().rstrip("=")
+        )
+        self.assertEqual(get_expires(now=100), 180)
+
+    def test_sign_media_url_disabled(self):
+        url = f"http://localhost:8080/cms/media/{self.approved_image.file}"
+        self.assertEqual(sign_media_url(url), url)
+
+    def test_check_permissions_cache_headers(self):
+        response = self.client.get(
+            self.image_auth_url,
+            headers={
+                "X-Original-Uri": f"{settings.MEDIA_URL}{str(self.approved_image.file)}?v=1"
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.headers["X-Image-Auth-Decision"], "public")
+        self.assertEqual(
+            response.headers["X-Accel-Expires"],
+            str(settings.IMAGE_AUTH_PUBLIC_MAX_AGE),
+        )
+
+        self.client.login(username=self.editor_username, password=self.editor_password)
+        response = self.client.get(
+            self.image_auth_url,
+            headers={
+                "X-Original-Uri": f"{settings.MEDIA_URL}{str(self.unpublished_image.file)}"
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.headers["X-Image-Auth-Decision"], "private")
+        self.assertEqual(response.headers["Cache-Control"], "private, no-store")
+        self.assertEqual(response.headers["X-Accel-Expires"], "0")
+
+    @override_settings(CACHES=LOCAL_CACHES)
+    def test_image_collection_ids_cached_and_invalidated(self):
+        self.assertEqual(
+            get_image_collection_ids(self.editor_user),
+            {self.public_image_collection.id},
+        )
+        editor_user = User.objects.get(pk=self.editor_user.pk)
+        with self.assertNumQueries(0):
+            get_image_collection_ids(editor_user)
+
+        moderators_group = Group.objects.create(name="Test Moderators")
+        GroupCollectionPermission.objects.create(
+            group=moderators_group,
+            collection=self.not_approved_image_collection,
+            permission=Permission.objects.get(
+                content_type=ContentType.objects.get_for_model(Image),
+                codename="choose_image",
+            ),
+        )
+        editor_user.groups.add(moderators_group)
+        editor_user = User.objects.get(pk=self.editor_user.pk)
+        self.assertEqual(
+            get_image_collection_ids(editor_user),
+            {self.public_image_collection.id, self.not_approved_image_collection.id},
+        )
+
+
+class BenchmarkImageAuthCommandTests(TestCase):
+    def test_benchmark_image_auth(self):
+        CustomImage = get_image_model()
+        n_images = CustomImage.objects.count()
+        out = StringIO()
+        call_command(
+            "benchmark_image_auth",
+            characters=2,
+            images=20,
+            live_pages=2,
+            requests=20,
+            json=True,
+            stdout=out,
+        )
+        summaries = json.loads(out.getvalue())
+        self.assertEqual(
+            [summary["scenario"] for summary in summaries],
+            ["anonymous-public", "anonymous-private", "editor", "nonexistent"],
+        )
+        statuses = {summary["scenario"]: summary["statuses"] for summary in summaries}
+        self.assertEqual(statuses["anonymous-public"], {"200": 20})
+        self.assertEqual(statuses["anonymous-private"], {"401": 20})
+        self.assertEqual(statuses["nonexistent"], {"404": 20})
+        for summary in summaries:
+            self.assertLessEqual(summary["p50"], summary["p99"])
+        self.assertEqual(CustomImage.objects.count(), n_images)
+
+
+class SharedVersionTests(TestCase):
+    def test_bump_reaches_other_processes(self):
+        # Process-local backends keep a copy of the cache per process.
+        cache = caches[settings.IMAGE_AUTH_CACHE_ALIAS]
+        self.assertNotIsInstance(cache, (LocMemCache, DummyCache))
+
+        # Another process has its own cache connection and local version.
+        other_cache = caches.create_connection(settings.IMAGE_AUTH_CACHE_ALIAS)
+        version = SharedVersion("test", settings.IMAGE_AUTH_CACHE_ALIAS)
+        other_version = SharedVersion(
+            "test", settings.IMAGE_AUTH_CACHE_ALIAS, local_timeout=0
+        )
+        old_version = other_version.get()
+        self.assertEqual(version.get(), old_version)
+
+        new_version = version.bump()
+        self.assertNotEqual(new_version, old_version)
+        self.assertEqual(other_cache.get(version.key), new_version)
+        self.assertEqual(other_version.get(), new_version)
@@ -1,7 +1,9 @@
 from django.urls import path
 
-from .views import check_permissions
+from .views import check_permissions, check_permissions_async, check_permissions_batch
 
 urlpatterns = [
     path("", check_permissions, name="image-permissions"),
+    path("async/", check_permissions_async, name="image-permissions-async"),
+    path("batch/", check_permissions_batch, name="image-permissions-batch"),
 ]
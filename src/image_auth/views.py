@@ -1,15 +1,43 @@
 import re
+from urllib.parse import unquote, urlsplit
 
 from django.conf import settings
+from django.http import HttpRequest, JsonResponse
+from django.views.decorators.http import require_GET
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.request import Request
 from rest_framework.response import Response
-from wagtail.images import get_image_model
-from wagtail.images.models import Image
-from wagtail.permission_policies.collections import CollectionPermissionPolicy
-
-from experience.models import Character
+from wagtail.images.models import IMAGE_FORMAT_EXTENSIONS
+from wagtail.images.utils import get_allowed_image_extensions
+
+from .decisions import (
+    DECISION_STATUS,
+    DENIED,
+    NOT_FOUND,
+    STATUS_MESSAGES,
+    aresolve_decisions,
+    get_cache_headers,
+    resolve_decisions,
+)
+from .serializers import BatchPermissionsRequestSerializer
+
+IMAGE_TYPES = {
+    "images": "rendition",
+    "original_images": "original",
+}
+IMAGE_EXTENSIONS = {
+    *get_allowed_image_extensions(),
+    *(extension.lstrip(".") for extension in IMAGE_FORMAT_EXTENSIONS.values()),
+}
+# Wagtail stores originals and renditions directly in their folders.
+MEDIA_PATH_PATTERN = re.compile(
+    rf"(?P<folder>{'|'.join(IMAGE_TYPES)})/[^/\\\x00-\x1f]+"
+    rf"\.(?:{'|'.join(sorted(IMAGE_EXTENSIONS))})",
+    re.IGNORECASE,
+)
+# Length of the file fields of images and renditions.
+MAX_MEDIA_PATH_LENGTH = 255
 
 
 @api_view(["GET"])
@@ -20,89 +48,117 @@ def check_permissions(request: Request) -> Response:
     that are referenced by a live page or in approved collections. Only authenticated users can
     view images not referenced by a live page or in approved collections.
     The requested image is passed in the "X-Original-Uri" header.
+    Anonymous requests for public images are answered from the public media index,
+    other decisions are cached per requested image and user, see image_auth.cache.
+    Responses carry headers that allow nginx to cache public decisions.
     """
-    try:
-        if not request.headers.get("X-Original-Uri"):
-            return Response(data={"message": "Bad Request"}, status=400)
+    if not request.headers.get("X-Original-Uri"):
+        return Response(data={"message": STATUS_MESSAGES[400]}, status=400)
 
-        requested_image = get_image_file(request.headers.get("X-Original-Uri"))
-        image_type = get_image_type(requested_image)
+    requested_image = get_image_file(request.headers.get("X-Original-Uri"))
+    image_type = get_image_type(requested_image)
 
-        if not image_type:
-            return Response(data={"message": "Bad Request"}, status=400)
+    if not image_type:
+        return Response(data={"message": STATUS_MESSAGES[400]}, status=400)
 
-        db_image = get_db_image(requested_image, image_type)
-        if not db_image:
-            return Response(data={"message": "Not found"}, status=404)
+    decision = resolve_decisions({requested_image: image_type}, request.user)[
+        requested_image
+    ]
 
-        if len(db_image.get_referenced_live_pages()) > 0:
-            return Response({"message": "OK"}, status=200)
+    status = DECISION_STATUS[decision]
+    return Response(
+        data={"message": STATUS_MESSAGES[status]},
+        status=status,
+        headers=get_cache_headers(decision),
+    )
 
-        characters_approved_collections = (
-            Character.objects.all()
-            .values_list("approved_collection_id", flat=True)
-            .distinct()
-        )
 
-        if db_image.collection_id in list(characters_approved_collections):
-            return Response({"message": "OK"}, status=200)
+@require_GET
+async def check_permissions_async(request: HttpRequest) -> JsonResponse:
+    """
+    Async version of check_permissions for ASGI deployments (see cheminova.asgi),
+    where many concurrent auth subrequests share a few workers. Uses the async ORM
+    and cache API, so a request only blocks a thread when the public media index is
+    rebuilt or the permissions of an editor are not cached.
+    """
+    original_uri = request.headers.get("X-Original-Uri")
+    if not original_uri:
+        return JsonResponse(data={"message": STATUS_MESSAGES[400]}, status=400)
 
-        if request.user.is_authenticated:
-            permission_policy = CollectionPermissionPolicy(
-                get_image_model(), auth_model=Image
-            )
-            if permission_policy.user_has_any_permission_for_instance(
-                request.user,
-                ["change", "add", "delete", "choose"],
-                db_image,
-            ):
-                return Response(data={"message": "OK"}, status=200)
-            else:
-                return Response(data={"message": "Unauthorized"}, status=401)
+    requested_image = get_image_file(original_uri)
+    image_type = get_image_type(requested_image)
 
-        return Response(data={"message": "Unauthorized"}, status=401)
+    if not image_type:
+        return JsonResponse(data={"message": STATUS_MESSAGES[400]}, status=400)
 
-    except Exception as e:
-        return Response(data={"message": str(e)}, status=400)
+    user = await request.auser()
+    decisions = await aresolve_decisions({requested_image: image_type}, user)
+    decision = decisions[requested_image]
 
+    status = DECISION_STATUS[decision]
+    return JsonResponse(
+        data={"message": STATUS_MESSAGES[status]},
+        status=status,
+        headers=get_cache_headers(decision),
+    )
 
-def get_image_file(image_url: str) -> str:
+
+@api_view(["POST"])
+@permission_classes([AllowAny])
+def check_permissions_batch(request: Request) -> Response:
     """
-    Get the original image file path from the image URL.
+    A view to check the permissions for many images at once, e.g. for all images a screen is
+    about to load. Expects the media URIs in "uris" and returns the decision and status for
+    each of them, keyed by URI. The decisions are cached, so the image requests that follow
+    are answered without querying the database. Unknown images are reported as denied, so
+    that clients cannot tell which private images exist.
     """
-    return image_url.replace(settings.MEDIA_URL, "")
+    request_serializer = BatchPermissionsRequestSerializer(data=request.data)
+    if not request_serializer.is_valid():
+        return Response(data=request_serializer.errors, status=400)
+
+    uris = request_serializer.validated_data["uris"]
+    requested_images = {}
+    for uri in uris:
+        requested_image = get_image_file(uri)
+        image_type = get_image_type(requested_image)
+        if image_type:
+            requested_images[requested_image] = image_type
 
+    decisions = resolve_decisions(requested_images, request.user)
 
-def get_image_type(image: str) -> str | None:
+    results = {}
+    for uri in uris:
+        decision = decisions.get(get_image_file(uri))
+        if decision == NOT_FOUND:
+            decision = DENIED
+        results[uri] = {
+            "decision": decision,
+            "status": DECISION_STATUS[decision] if decision else 400,
+        }
+    return Response(data={"results": results}, status=200)
+
+
+def get_image_file(image_url: str) -> str:
     """
-    Check whether the image is a rendition or an original image.
+    Get the original image file path from the image URL, without query parameters.
     """
-    if re.match(r"^images/", image):
-        return "rendition"
-    elif re.match(r"^original_images/", image):
-        return "original"
-    else:
-        return None
+    try:
+        path = urlsplit(image_url).path
+    except ValueError:
+        return ""
+    return unquote(path).replace(settings.MEDIA_URL, "")
 
 
-def get_db_image(requested_image: str, image_type: str) -> str | None:
+def get_image_type(image: str) -> str | None:
     """
-    Get the image from the database.
+    Check whether the image is a rendition or an original image. Paths that cannot be
+    media files of an image, e.g. in other folders, in subfolders or with other file
+    extensions, are rejected before touching the database.
     """
-    Image = get_image_model()
-    RenditionModel = Image.get_rendition_model()
-
-    match image_type:
-        case "rendition":
-            try:
-                db_image = RenditionModel.objects.get(file=requested_image).image
-                return db_image
-            except RenditionModel.DoesNotExist:
-                return None
-
-        case "original":
-            try:
-                db_image = Image.objects.get(file=requested_image)
-                return db_image
-            except Image.DoesNotExist:
-                return None
+    if len(image) > MAX_MEDIA_PATH_LENGTH:
+        return None
+    match = MEDIA_PATH_PATTERN.fullmatch(image)
+    if not match:
+        return None
+    return IMAGE_TYPES[match["folder"]]
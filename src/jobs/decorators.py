@@ -0,0 +1,69 @@
+import functools
+from collections.abc import Callable
+
+from django.conf import settings
+
+from .models import Job
+
+
+class JobFunction:
+    """
+    A function that can be run by the run_worker command. Workers import it by its
+    dotted path, so it must be defined at module level.
+    """
+
+    def __init__(
+        self,
+        func: Callable,
+        priority: int = 0,
+        max_attempts: int | None = None,
+        timeout: int | None = None,
+    ):
+        functools.update_wrapper(self, func)
+        self.func = func
+        self.name = f"{func.__module__}.{func.__qualname__}"
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, *args, **kwargs) -> Job:
+        """
+        Queue a call with JSON serializable arguments. Jobs queued in a transaction
+        only become visible to workers when it is committed.
+        """
+        return Job.objects.create(
+            name=self.name,
+            args=list(args),
+            kwargs=kwargs,
+            priority=self.priority,
+            max_attempts=self.max_attempts or settings.JOBS_MAX_ATTEMPTS,
+            timeout=self.timeout or settings.JOBS_TIMEOUT,
+        )
+
+
+def job(
+    func: Callable | None = None,
+    *,
+    priority: int = 0,
+    max_attempts: int | None = None,
+    timeout: int | None = None,
+):
+    """
+    Decorator that turns a function into a JobFunction, with or without options:
+
+        @job
+        def warm_cache(): ...
+
+        @job(priority=10, timeout=60)
+        def generate_renditions(image_id): ...
+    """
+    if func is None:
+        return functools.partial(
+            job, priority=priority, max_attempts=max_attempts, timeout=timeout
+        )
+    return JobFunction(
+        func, priority=priority, max_attempts=max_attempts, timeout=timeout
+    )
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from jobs.worker import POOLS, Worker
+
+
+class Command(BaseCommand):
+    help = "Run queued jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-c",
+            "--concurrency",
+            type=int,
+            default=settings.JOBS_CONCURRENCY,
+            help=f"Number of jobs to run at once. (default: {settings.JOBS_CONCURRENCY})",
+        )
+        parser.add_argument(
+            "-p",
+            "--pool",
+            choices=POOLS,
+            default="thread",
+            help="Run jobs in threads, processes or inline in the worker's thread. (default: thread)",
+        )
+        parser.add_argument(
+            "-b",
+            "--burst",
+            action="store_true",
+            help="Exit once no jobs are due instead of waiting for new ones.",
+        )
+
+    def handle(self, *args, **options):
+        if options["concurrency"] < 1:
+            raise CommandError("The concurrency must be at least 1.")
+        Worker(concurrency=options["concurrency"], pool=options["pool"]).run(
+            burst=options["burst"]
+        )
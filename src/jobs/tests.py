@@ -0,0 +1,90 @@
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from .decorators import job
+from .models import Job
+from .worker import claim_jobs, run_job
+
+calls = []
+
+
+@job
+def record(value):
+    calls.append(value)
+
+
+@job(priority=10)
+def record_first(value):
+    calls.append(value)
+
+
+@job(max_attempts=2)
+def fail():
+    raise ValueError("Failed on purpose")
+
+
+class JobTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_run_worker(self):
+        queued_job = record.enqueue("a")
+        self.assertEqual(queued_job.name, "jobs.tests.record")
+        self.assertEqual(queued_job.status, Job.QUEUED)
+
+        call_command("run_worker", "--burst", "--pool", "inline")
+        self.assertEqual(calls, ["a"])
+        queued_job.refresh_from_db()
+        self.assertEqual(queued_job.status, Job.SUCCEEDED)
+        self.assertEqual(queued_job.attempts, 1)
+        self.assertIsNotNone(queued_job.finished_at)
+
+    def test_priority(self):
+        record.enqueue("low")
+        record_first.enqueue("high")
+        call_command("run_worker", "--burst", "--pool", "inline", "-c", "1")
+        self.assertEqual(calls, ["high", "low"])
+
+    def test_retry(self):
+        failing_job = fail.enqueue()
+        self.assertEqual(claim_jobs("test", 10), [failing_job.pk])
+        with self.assertLogs("jobs.worker", "ERROR"):
+            run_job(failing_job.pk, "test")
+        failing_job.refresh_from_db()
+        self.assertEqual(failing_job.status, Job.QUEUED)
+        self.assertGreater(failing_job.run_after, timezone.now())
+        self.assertIn("Failed on purpose", failing_job.last_error)
+        self.assertEqual(claim_jobs("test", 10), [])
+
+        Job.objects.filter(pk=failing_job.pk).update(run_after=timezone.now())
+        self.assertEqual(claim_jobs("test", 10), [failing_job.pk])
+        with self.assertLogs("jobs.worker", "ERROR"):
+            run_job(failing_job.pk, "test")
+        failing_job.refresh_from_db()
+        self.assertEqual(failing_job.status, Job.FAILED)
+        self.assertEqual(failing_job.attempts, 2)
+
+    def test_timeout(self):
+        timed_out_job = record.enqueue("a")
+        self.assertEqual(claim_jobs("dead", 10), [timed_out_job.pk])
+        self.assertEqual(claim_jobs("test", 10), [])
+
+        # The first worker died, the job is claimed again after its timeout.
+        past = timezone.now() - timedelta(seconds=1)
+        Job.objects.filter(pk=timed_out_job.pk).update(run_after=past)
+        self.assertEqual(claim_jobs("test", 10), [timed_out_job.pk])
+        run_job(timed_out_job.pk, "dead")
+        self.assertEqual(calls, [])
+        run_job(timed_out_job.pk, "test")
+        self.assertEqual(calls, ["a"])
+
+        timed_out_job = record.enqueue("b")
+        Job.objects.filter(pk=timed_out_job.pk).update(
+            status=Job.RUNNING, attempts=3, run_after=past
+        )
+        self.assertEqual(claim_jobs("test", 10), [])
+        timed_out_job.refresh_from_db()
+        self.assertEqual(timed_out_job.status, Job.FAILED)
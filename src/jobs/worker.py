@@ -0,0 +1,214 @@
+import multiprocessing
+import os
+import signal
+import socket
+import time
+import traceback
+import uuid
+from collections import defaultdict
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from datetime import timedelta
+from logging import getLogger
+
+import django
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = getLogger(__name__)
+
+POOLS = ("thread", "process", "inline")
+
+
+def claim_jobs(worker_id: str, limit: int) -> list[int]:
+    """
+    Claim up to limit due jobs, by priority and age. Jobs locked by other workers
+    are skipped. Running jobs that timed out are claimed again, or failed if they
+    have no attempts left.
+    """
+    now = timezone.now()
+    Job.objects.filter(
+        status=Job.RUNNING, run_after__lte=now, attempts__gte=F("max_attempts")
+    ).update(status=Job.FAILED, last_error="Timed out.", finished_at=now)
+
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status__in=[Job.QUEUED, Job.RUNNING], run_after__lte=now)
+            .order_by("-priority", "run_after", "id")
+            .values_list("id", "timeout")[:limit]
+        )
+        ids_by_timeout = defaultdict(list)
+        for job_id, timeout in jobs:
+            ids_by_timeout[timeout].append(job_id)
+        for timeout, job_ids in ids_by_timeout.items():
+            Job.objects.filter(pk__in=job_ids).update(
+                status=Job.RUNNING,
+                attempts=F("attempts") + 1,
+                locked_by=worker_id,
+                run_after=now + timedelta(seconds=timeout),
+            )
+    return [job_id for job_id, _ in jobs]
+
+
+def run_job(job_id: int, worker_id: str) -> None:
+    """
+    Run a claimed job and record the result. Failed jobs are queued again with an
+    exponential backoff of JOBS_RETRY_DELAY until they have no attempts left.
+    Results of jobs that were claimed by another worker in the meantime are dropped.
+    """
+    job = Job.objects.filter(pk=job_id, status=Job.RUNNING, locked_by=worker_id).first()
+    if job is None:
+        return
+    claimed = Job.objects.filter(pk=job.pk, locked_by=worker_id, attempts=job.attempts)
+
+    logger.info(f"Running job {job.pk} {job.name}, attempt {job.attempts}.")
+    try:
+        import_string(job.name)(*job.args, **job.kwargs)
+    except Exception:
+        logger.exception(f"Job {job.pk} {job.name} failed.")
+        now = timezone.now()
+        if job.attempts < job.max_attempts:
+            delay = settings.JOBS_RETRY_DELAY * 2 ** (job.attempts - 1)
+            claimed.update(
+                status=Job.QUEUED,
+                run_after=now + timedelta(seconds=delay),
+                locked_by="",
+                last_error=traceback.format_exc(),
+            )
+        else:
+            claimed.update(
+                status=Job.FAILED,
+                locked_by="",
+                last_error=traceback.format_exc(),
+                finished_at=now,
+            )
+    else:
+        claimed.update(status=Job.SUCCEEDED, locked_by="", finished_at=timezone.now())
+
+
+def run_job_in_pool(job_id: int, worker_id: str) -> None:
+    """
+    Run a job in a pool thread or process, which has its own database connections.
+    """
+    close_old_connections()
+    try:
+        run_job(job_id, worker_id)
+    finally:
+        close_old_connections()
+
+
+def prune_jobs() -> None:
+    """
+    Delete the jobs that finished more than JOBS_RETENTION seconds ago.
+    """
+    Job.objects.filter(
+        status__in=[Job.SUCCEEDED, Job.FAILED],
+        finished_at__lt=timezone.now() - timedelta(seconds=settings.JOBS_RETENTION),
+    ).delete()
+
+
+class InlineExecutor(Executor):
+    """
+    Runs jobs in the worker's own thread, for debugging and tests.
+    """
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+class Worker:
+    """
+    Claims due jobs and runs them in a pool of threads or processes until it is
+    stopped with SIGINT or SIGTERM, or, in burst mode, until no jobs are due.
+    Running jobs are finished before the worker exits.
+    """
+
+    def __init__(self, concurrency: int, pool: str = "thread"):
+        self.id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.concurrency = concurrency
+        self.pool = pool
+        self.stopping = False
+
+    def get_executor(self) -> Executor:
+        if self.pool == "inline":
+            return InlineExecutor()
+        if self.pool == "process":
+            # Connections must not be shared with the pool processes.
+            connections.close_all()
+            return ProcessPoolExecutor(
+                max_workers=self.concurrency,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=django.setup,
+            )
+        return ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="jobs"
+        )
+
+    def stop(self, *args) -> None:
+        logger.info(f"Stopping worker {self.id}.")
+        self.stopping = True
+
+    def run(self, burst: bool = False) -> None:
+        handlers = {
+            signum: signal.signal(signum, self.stop)
+            for signum in (signal.SIGINT, signal.SIGTERM)
+        }
+        executor = self.get_executor()
+        target = run_job if self.pool == "inline" else run_job_in_pool
+        running = set()
+        pruned_at = 0.0
+        logger.info(
+            f"Worker {self.id} started with {self.concurrency} worker(s) "
+            f"({self.pool} pool)."
+        )
+        try:
+            while not self.stopping:
+                if time.monotonic() - pruned_at > settings.JOBS_PRUNE_INTERVAL:
+                    prune_jobs()
+                    pruned_at = time.monotonic()
+
+                free = self.concurrency - len(running)
+                job_ids = claim_jobs(self.id, free) if free else []
+                running.update(
+                    executor.submit(target, job_id, self.id) for job_id in job_ids
+                )
+                for future in [future for future in running if future.done()]:
+                    running.discard(future)
+                    if future.exception() is not None:
+                        logger.error(
+                            "Running a job failed.", exc_info=future.exception()
+                        )
+                if job_ids and len(running) < self.concurrency:
+                    continue
+                if burst and not job_ids and not running:
+                    break
+                if running:
+                    wait(
+                        running,
+                        timeout=settings.JOBS_POLL_INTERVAL,
+                        return_when=FIRST_COMPLETED,
+                    )
+                else:
+                    time.sleep(settings.JOBS_POLL_INTERVAL)
+        finally:
+            executor.shutdown(wait=True)
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+            logger.info(f"Worker {self.id} stopped.")
@@ -209,3 +209,32 @@ def randomize_timestamps(
         f"{f' -n {n_days}' if n_days else ''}",
         pty=True,
     )
+
+
+@task(
+    help={
+        "show_help": "Show help for the manage.py benchmark_image_auth command. (type --show-help or -s)",
+    },
+)
+def benchmark_image_auth(
+    c,
+    images=None,
+    requests=None,
+    view=None,
+    json=False,
+    show_help=False,
+):
+    """
+    Benchmark the image-auth view using manage.py benchmark_image_auth command.
+    To see all options and defaults of the manage.py benchmark_image_auth command, use the --show-help option:
+    uv run invoke benchmark-image-auth --show-help
+    """
+    c.run(
+        f"docker compose exec wagtail uv run manage.py benchmark_image_auth"
+        f"{' --help' if show_help else ''}"
+        f"{f' -i {images}' if images else ''}"
+        f"{f' -n {requests}' if requests else ''}"
+        f"{f' --view {view}' if view else ''}"
+        f"{' --json' if json else ''}",
+        pty=True,
+    )